@@ -0,0 +1,82 @@
+import sys
+import contextlib
+import json
+import argparse
+import pandas as pd
+import storage
+import pipeline
+import profiling
+import synthetic
+
+# =============== SETTINGS ================
+SCALES = [1, 10, 100]
+# copies get their ids shifted by this step, so the dedup in cleaning_data keeps them
+ID_STEP = 10 ** 10
+TOLERANCE = 0.2
+
+# =============== DATASETS ================
+def scale_dataset(data, factor):
+    copies = [data.assign(id=data['id'] + copy * ID_STEP) for copy in range(factor)]
+    return pd.concat(copies, ignore_index=True)
+
+def synthetic_dataset(path, factor):
+    model = synthetic.fit(path)
+    data = pd.concat(synthetic.generate(model, len(model['templates']) * factor), ignore_index=True)
+    return storage.conform(data)
+
+# =============== RUN ================
+# per-stage records of one full pipeline run for every scale
+def run(path, scales=SCALES, generator='replicate'):
+    raw = storage.read_dataset(path)
+    results = {}
+    for factor in scales:
+        data = scale_dataset(raw, factor) if generator == 'replicate' else synthetic_dataset(path, factor)
+        profiling.PROFILER.reset()
+        pipeline.run_pipeline(data)
+        results[str(factor)] = {'rows': len(data), 'stages': profiling.PROFILER.records}
+    return results
+
+def summary(results):
+    return pd.DataFrame({f'{factor}x wall (s)': {name: entry['wall'] for name, entry in result['stages'].items()}
+                         for factor, result in results.items()})
+
+# stages whose wall time grew more than the tolerance over the baseline run
+def regressions(results, baseline, tolerance=TOLERANCE):
+    slower = []
+    for factor, result in results.items():
+        previous = baseline.get(factor, {}).get('stages', {})
+        for name, entry in result['stages'].items():
+            if name in previous and entry['wall'] > previous[name]['wall'] * (1 + tolerance):
+                slower.append(f'{factor}x {name}: {previous[name]["wall"]:.4f}s -> {entry["wall"]:.4f}s')
+    return slower
+
+# =============== CLI ================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Times every pipeline stage on copies of the dataset '
+                                                 'scaled by each factor.')
+    parser.add_argument('input', nargs='?', default='kc_house_data.csv')
+    parser.add_argument('--scales', type=int, nargs='+', default=SCALES)
+    parser.add_argument('--generator', choices=['replicate', 'synthetic'], default='replicate',
+                        help='copy the dataset with shifted ids, or draw a synthetic one of the same size')
+    parser.add_argument('--trace-memory', action='store_true', help='measure peak memory with tracemalloc (slower)')
+    parser.add_argument('--output', help='json file for the results')
+    parser.add_argument('--baseline', help='json of a previous run to compare against')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='allowed slowdown over the baseline')
+    args = parser.parse_args(argv)
+
+    with profiling.traced_memory() if args.trace_memory else contextlib.nullcontext():
+        results = run(args.input, args.scales, args.generator)
+    print(summary(results).to_string(float_format='{:.4f}'.format))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            slower = regressions(results, json.load(f), args.tolerance)
+        for line in slower:
+            print('slower:', line)
+        if slower:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+# =============== SETTINGS ================
+# scatters above this many points are aggregated before they reach the browser
+POINT_BUDGET = 5000
+# 'density' bins the points, 'sample' draws at most POINT_BUDGET of them
+SCATTER_MODE = 'density'
+BINS = 40
+
+# =============== COUNTS ================
+def value_counts(data, column):
+    chart_data = data.groupby([column]).size().rename('Quantity')
+    return chart_data.reset_index()
+
+# =============== SCATTERS ================
+def sample(data, budget=POINT_BUDGET, seed=0):
+    if len(data) <= budget:
+        return data
+    return data.sample(n=budget, random_state=seed)
+
+def bin_edges(values, bins=BINS):
+    low, high = float(values.min()), float(values.max())
+    if low == high:
+        high = low + 1
+    return np.linspace(low, high, bins + 1)
+
+# 2d histogram of two numeric columns, one row per non-empty cell
+def histogram2d(data, x, y='price', bins=BINS):
+    x_edges, y_edges = bin_edges(data[x], bins), bin_edges(data[y], bins)
+    counts, _, _ = np.histogram2d(data[x], data[y], bins=[x_edges, y_edges])
+    xi, yi = np.nonzero(counts)
+    return pd.DataFrame({f'{x}_start': x_edges[xi], f'{x}_end': x_edges[xi + 1],
+                         f'{y}_start': y_edges[yi], f'{y}_end': y_edges[yi + 1],
+                         'Quantity': counts[xi, yi].astype(np.int64)})
+
+# counts of y bins per category of x, with y at the bin middle
+def category_histogram(data, x, y='price', bins=BINS):
+    edges = bin_edges(data[y], bins)
+    position = np.clip(np.digitize(data[y], edges) - 1, 0, bins - 1)
+    middle = (edges[:-1] + edges[1:]) / 2
+    chart_data = data.groupby([data[x], middle[position]], observed=True).size()
+    chart_data = chart_data.rename_axis([x, y]).rename('Quantity').reset_index()
+    return chart_data.loc[chart_data['Quantity'] > 0].reset_index(drop=True)
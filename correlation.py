@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+# =============== RUNNING PEARSON ================
+# keeps the row count, column means and co-moment matrix, so a batch of new rows
+# updates the correlation without rescanning the rows already seen
+class RunningCorrelation:
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.count = 0
+        self.mean = np.zeros(len(self.columns))
+        self.comoment = np.zeros((len(self.columns), len(self.columns)))
+
+    def update(self, data):
+        values = data[self.columns].to_numpy(dtype=np.float64)
+        count = len(values)
+        if count == 0:
+            return self
+        mean = values.mean(axis=0)
+        centered = values - mean
+        comoment = centered.T @ centered
+
+        # merges the batch with the running moments (Chan et al. pairwise update)
+        total = self.count + count
+        delta = mean - self.mean
+        self.comoment = self.comoment + comoment + np.outer(delta, delta) * self.count * count / total
+        self.mean = self.mean + delta * count / total
+        self.count = total
+        return self
+
+    def matrix(self):
+        deviation = np.sqrt(np.diag(self.comoment))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            matrix = self.comoment / np.outer(deviation, deviation)
+        return pd.DataFrame(matrix, index=self.columns, columns=self.columns)
@@ -1,3 +1,6 @@
+import io
+import os
+import contextlib
 import streamlit as st
 import pandas as pd
 import numpy as np
@@ -5,6 +8,20 @@ import seaborn as sns
 import plotly.express as px
 import matplotlib.pyplot as plt
 import altair as alt
+from matplotlib.figure import Figure
+import storage
+import pipeline
+import registry
+import schema
+import profiling
+import charts
+import maps
+import correlation
+import filters
+import scoring
+import whatif
+import regional
+import valuation
 
 # =============== SETTINGS ================
 def settings():
@@ -17,172 +34,89 @@ def settings():
     plt.style.use('Solarize_Light2')
 
 # =============== GETING DATA ================
-def get_data(path):
-    data = pd.read_csv(path)
-    return data
-
-def cleaning_data(data):
-    data['date'] = pd.to_datetime(data['date'], format='%Y-%m-%d')
-    data = data.sort_values(by='date').drop_duplicates(subset='id', keep='first')
-    data = data.reset_index(drop=True)
-    data['floors'] = round(data['floors'],1)
-    data.loc[data['bedrooms'] == 33].replace({33: 3})
-    return data
-
-# =============== FEATURES ================
-def ft_waterfront(data):
-    data['waterfront'] = pd.Categorical(data['waterfront'])
-    data['waterfront'] = data['waterfront'].cat.rename_categories({0: 'no', 1: 'yes'})
-    return data
-
-def ft_condition(data):
-    data['condition'] = pd.Categorical(data['condition'])
-    data['condition'] = data['condition'].cat.rename_categories(
-        {1: 'very bad', 2: 'bad', 3: 'average', 4: 'good', 5: 'excelent'})
-    return data
-
-def ft_view(data):
-    data['view'] = pd.Categorical(data['view'])
-    data['view'] = data['view'].cat.rename_categories({0: 'no view', 1: 'bad', 2: 'average', 3: 'good', 4: 'excelent'})
-    return data
-
-def ft_grade(data):
-    data['grade'] = data['grade'].apply(lambda x: "very poor" if x <= 3 else
-    "poor" if x <= 5 else
-    "average" if x <= 8 else
-    "good" if x <= 10 else
-    "excelent" if x <= 13 else 'na')
-    data['grade'] = pd.Categorical(data['grade'])
-    return data
-
-def season(month, day):
-    # ------ winter -----------
-    # Dec and >= 21st
-    if month == 12 and day >= 21:
-        return 'winter'
-
-    # Jan and Feb
-    if month == 1 or month == 2:
-        return 'winter'
-
-    # Mar and < 21st
-    if month == 3 and day < 21:
-        return 'winter'
-
-    # ------ Spring -----------
-
-    # Mar and >= 21st
-    if month == 3 and day >= 21:
-        return 'spring'
-
-    # Apr and May
-    if month == 4 or month == 5:
-        return 'spring'
-
-    # Jun and < 21st
-    if month == 6 and day < 21:
-        return 'spring'
-
-    # ------ Summer -----------
-
-    # Jun and >= 21st
-    if month == 6 and day >= 21:
-        return 'summer'
-    # Jul and Aug
-    if month == 7 or month == 8:
-        return 'summer'
-
-    # Sep and < 23st
-    if month == 9 and day < 23:
-        return 'summer'
-
-    # ------ Fall -----------
-
-    # Jun and >= 23st
-    if month == 9 and day >= 23:
-        return 'fall'
-
-    # Oct and Nov
-    if month == 10 or month == 11:
-        return 'fall'
-    # Dec and <21st
-    if month == 12 and day < 21:
-        return 'fall'
-
-def ft_season(data):
-    data['day'] = pd.DatetimeIndex(data['date']).day
-    data['month'] = pd.DatetimeIndex(data['date']).month
-    data['season'] = data[['month', 'day']].apply(lambda x: season(month=x['month'], day=x['day']), axis=1)
-    data.drop(columns=['month', 'day'], inplace=True)
-    return data
-
-def ft_bathrooms(data):
-    df = pd.DataFrame(data['bathrooms'].astype(str).str.split('.', expand=True))
-    data['complete_bathrooms'] = np.int64(df[0])
-    data['half_bathroom'] = df[1]
-    data['half_bathroom'] = data['half_bathroom'].apply(lambda x: "no" if x == "0" else "yes")
-    data['half_bathroom'] = pd.Categorical(data['half_bathroom'])
-    data = data.loc[data['complete_bathrooms'] != 0]
-    data.drop(columns = ['bathrooms'],inplace = True)
-    data = data.reset_index(drop=True)
-    return data
-
-def last_maintenance(built, renovated):
-    if renovated == 0:
-        return built
-    else:
-        return renovated
-
-def ft_last_maintenance(data):
-    data['last_maintenance'] = data[['yr_built', 'yr_renovated']].apply(
-        lambda x: last_maintenance(built=x.yr_built, renovated=x.yr_renovated), axis=1)
-    return data
-
-def ft_price_sqft(data):
-    data['price_sqft'] = round(data['price'] / data['sqft_living'],2)
-    return data
-
-def ft_regional_condition(data):
-    df = data[['zipcode', 'condition']].groupby(['zipcode']).mean()
-    df.rename(columns={'condition': 'regional_condition'}, inplace=True)
-    data = data.merge(df, on='zipcode', how='left')
-    return data
-
-def ft_regional_price(data):
-    df = data[['zipcode','price_sqft']].groupby(['zipcode']).mean()
-    df.rename(columns = {'price_sqft':'regional_price_sqft'},inplace = True)
-    data = data.merge(df,on='zipcode',how='left')
-    data['expected_price'] = round(data['regional_price_sqft'] * data['sqft_living'], 2)
-    data['profit'] = round(data['expected_price'] - data['price'],2)
-
-    return data
-
-def ft_buy(data):
-    data['buy'] = data[['regional_price_sqft','price_sqft','regional_condition','condition','expected_price','price']].apply(lambda x: 'yes' if ((x['price_sqft']<x['regional_price_sqft']) & #sqft price bellow market
-                                                                                                                       (x['regional_condition']<x['condition'])& # Regional Condition
-                                                                                                                       ((x['expected_price']/x['price'])>1.6)) # Margin Profit greater than 60%
-                                                                                                                    else 'no',axis = 1)
-    return data
-
-# =============== Data Frames ================
-# filters the houses to buy
-def ft_df_buy(data):
-    data = data.loc[(data['buy'] == 'yes') & (data['condition'] != 'bad')].copy()
-    print(data.columns)
-    data = data[['id', 'date','season', 'price','expected_price','profit','price_sqft', 'regional_price_sqft',
-        'complete_bathrooms', 'half_bathroom', 'bedrooms', 'floors', 'sqft_living', 'sqft_above','sqft_basement', 'sqft_lot',
-       'view', 'condition', 'grade','waterfront', 'yr_built', 'yr_renovated','last_maintenance', 'zipcode', 'lat', 'long']]
-    data = data.reset_index(drop = True)
-    return data
+# processes computing the features per zipcode shard, 1 runs the serial pipeline
+PIPELINE_WORKERS = 1
+
+# regional definitions offered in the sidebar, see pipeline.REGION
+REGIONS = {'Zipcode': 'zipcode', 'Nearest neighbours': 'neighbors'}
+# how the investment view prices expected_price: the pipeline's regional price per sqft or a valuation model
+PRICINGS = {'Regional price per sqft': 'regional', 'Ridge regression per zipcode': 'ridge'}
+
+# markets of the sidebar; get_data -> ft_df_buy runs once per market version (the csv content hash) and
+# regional definition, and every session reads the same memory-mapped frames. The per-zipcode stats table is returned for reuse
+@st.experimental_singleton
+def dataset_registry():
+    return registry.Registry()
+
+def load_data(market, version, region=pipeline.REGION):
+    return dataset_registry().load(market, version, region, workers=PIPELINE_WORKERS)
+
+# dataset version of a source csv: its content hash, only recomputed when the file's mtime or size changes
+@st.experimental_memo(max_entries=16, show_spinner=False)
+def source_version(path, mtime_ns, size):
+    return storage.source_hash(path)
+
+def dataset_version(path):
+    stat = os.stat(path)
+    return source_version(path, stat.st_mtime_ns, stat.st_size)
+
+# rendered figures of the views, one dict per dataset version and regional definition shared across sessions
+@st.experimental_singleton(max_entries=4)
+def figure_cache(version, region=pipeline.REGION):
+    return {}
+
+# query index of data, built once per dataset version, regional definition and pricing
+@st.experimental_singleton(max_entries=8)
+def house_index(version, region, pricing, _data):
+    return filters.HouseIndex(_data, whatif.priced_columns(buy_criteria(version, region, pricing, _data)))
+
+# zipcode x season median price per sqft the sell suggestions are looked up in, once per dataset version
+@st.experimental_singleton(max_entries=4)
+def seasonal_prices(version, _data):
+    return regional.seasonal_prices(_data)
+
+# valuation model fitted once per dataset version; the rows are the same for every regional definition
+@st.experimental_singleton(max_entries=4)
+def price_model(version, _data):
+    return valuation.ZipcodeRidge().fit(pipeline.condition_score(_data))
+
+# columns the buy thresholds are compared with, once per dataset version, regional definition and pricing
+@st.experimental_singleton(max_entries=8)
+def buy_criteria(version, region, pricing, _data):
+    if pricing == 'ridge':
+        return whatif.criteria(_data, price_model(version, _data).predict(pipeline.condition_score(_data)))
+    return whatif.criteria(_data)
+
+def cached_figure(cache, key, build):
+    if cache is None:
+        return build()
+    if key not in cache:
+        cache[key] = build()
+    return cache[key]
 
 # =============== Graphic Models ================
-def gr_model1(data,column):
-    data['Quantity'] = 1
-    chart_data = pd.DataFrame(data.groupby([column]).count()['Quantity'])
-    chart_data = chart_data.reset_index()
-    chart_data[chart_data.columns[0]] = pd.Categorical(chart_data[chart_data.columns[0]])
+CORRELATION_COLUMNS = ['sqft_living', 'sqft_lot', 'sqft_basement', 'bedrooms', 'complete_bathrooms', 'floors',
+                       'yr_renovated', 'yr_built', 'last_maintenance', 'price']
+
+# png of the heatmap keyed on the matrix values, drawn on a standalone Figure
+# so no pyplot figure is left open
+@st.experimental_memo(max_entries=16, show_spinner=False)
+def gr_heatmap(matrix):
+    fig = Figure()
+    ax = fig.subplots()
+    sns.heatmap(matrix, annot=True, ax=ax)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=200, bbox_inches='tight')
+    return buffer.getvalue()
+
+def gr_model1(data,column,cache=None):
     title = f'{column.title()} Variable'
     st.markdown(f'<div style="text-align: center;"><b> {title} </b></div>', unsafe_allow_html=True)
+    gr = cached_figure(cache, ('gr_model1', column), lambda: ch_model1(data, column))
+    return st.altair_chart(gr, use_container_width=True)
+def ch_model1(data,column):
+    chart_data = charts.value_counts(data, column)
+    chart_data[chart_data.columns[0]] = pd.Categorical(chart_data[chart_data.columns[0]])
     if (len(chart_data) <= 5):
         gr = alt.Chart(chart_data).mark_bar(size=50).encode(
             x=chart_data.columns[0],
@@ -211,14 +145,19 @@ def gr_model1(data,column):
             color=alt.Color(chart_data.columns[0],
                             scale=alt.Scale(scheme='category20'),
                             legend=None))
-    return st.altair_chart(gr, use_container_width=True)
-def gr_model2(data,column,type):
-    chart_data = data[[column,'price']]
+    return gr
+def gr_model2(data,column,type,cache=None):
     title = f'{column.title()} Vs Price ($)'
+    st.markdown(f'<div style="text-align: center;"><b> {title} </b></div>', unsafe_allow_html=True)
+    gr = cached_figure(cache, ('gr_model2', column), lambda: ch_model2(data, column, type))
+    return st.altair_chart(gr, theme="streamlit", use_container_width=True)
+def ch_model2(data,column,type):
+    if len(data) > charts.POINT_BUDGET and charts.SCATTER_MODE == 'density':
+        return ch_density(data, column, type)
+    chart_data = charts.sample(data[[column,'price']].copy())
     if column == 'yr_built' or column == 'sqft_basement' :
         chart_data[chart_data.columns[0]] = pd.Categorical(chart_data[chart_data.columns[0]])
     if type == 'quality':
-        st.markdown(f'<div style="text-align: center;"><b> {title} </b></div>', unsafe_allow_html=True)
         gr = alt.Chart(chart_data).mark_circle().encode(
             x=chart_data.columns[0],
             y=chart_data.columns[1],
@@ -227,25 +166,60 @@ def gr_model2(data,column,type):
                             legend=None)
     )
     else:
-        st.markdown(f'<div style="text-align: center;"><b> {title} </b></div>', unsafe_allow_html=True)
         gr = alt.Chart(chart_data).mark_circle().encode(
             x=chart_data.columns[0],
             y=chart_data.columns[1])
-    return st.altair_chart(gr, theme="streamlit", use_container_width=True)
-def gr_model3(data,column):
+    return gr
+# binned version of ch_model2, the spec size depends on the bins and not on the rows
+def ch_density(data,column,type):
+    if type == 'quality':
+        chart_data = charts.category_histogram(data, column)
+        gr = alt.Chart(chart_data).mark_circle().encode(
+            x=column,
+            y='price',
+            size=alt.Size('Quantity', legend=None),
+            color=alt.Color(column,
+                            scale=alt.Scale(scheme='category10'),
+                            legend=None),
+            tooltip=[column, 'price', 'Quantity'])
+    else:
+        chart_data = charts.histogram2d(data, column)
+        gr = alt.Chart(chart_data).mark_rect().encode(
+            x=alt.X(f'{column}_start', title=column),
+            x2=f'{column}_end',
+            y=alt.Y('price_start', title='price'),
+            y2='price_end',
+            color=alt.Color('Quantity', scale=alt.Scale(scheme='blues')),
+            tooltip=['Quantity'])
+    return gr
+# grid clusters of one map selection at one zoom level, computed once per key; the key names
+# the dataset version, regional definition and whatever picked the rows
+@st.experimental_memo(max_entries=64, show_spinner=False)
+def map_clusters(key, column, zoom, _data):
+    return maps.cluster(_data, column, zoom)
+
+def gr_model3(data,column,zoom=10,renderer='plotly',key=None):
+    # large selections are sent as grid clusters for the chosen zoom level
+    if len(data) > maps.MAX_MARKERS:
+        data = maps.cluster(data, column, zoom) if key is None else map_clusters(key, column, zoom, data)
+    if renderer == 'pydeck':
+        return st.pydeck_chart(maps.deck(data, column, zoom), use_container_width=True)
     fig = px.scatter_mapbox(data,
                             lat="lat",
                             lon="long",
                             color=column,
-                            zoom=10)
+                            size='Quantity' if 'Quantity' in data else None,
+                            zoom=zoom)
 
     fig.update_layout(mapbox_style="open-street-map")
-    fig.update_traces(marker={'size': 10})
+    if 'Quantity' not in data:
+        fig.update_traces(marker={'size': 10})
     fig.update_layout(height=800, margin={"r": 0, "t": 0, "l": 0, "b": 0})
     return st.plotly_chart(fig,use_container_width=True)
 
 # =============== TABS ================
-def set_home(df, tab, data):
+@profiling.profiled
+def set_home(tab, data):
     with tab:
         st.title('🏠 House Rocket Info :rocket:')
         st.markdown(
@@ -333,7 +307,8 @@ def set_home(df, tab, data):
             st.dataframe(data.select_dtypes('category').describe().T, width=600)
     pass
 
-def set_exploratory_analisys(data, tab):
+@profiling.profiled
+def set_exploratory_analisys(data, tab, cache=None):
     with tab:
         st.title('📈 Data Analisys')
         st.markdown(
@@ -380,11 +355,11 @@ def set_exploratory_analisys(data, tab):
         # =============== Graphics ================
         c1, c2, c3 = st.columns(3)
         with c1:
-            gr_model1(data=data, column='bedrooms')
+            gr_model1(data=data, column='bedrooms', cache=cache)
         with c2:
-            gr_model1(data=data, column='complete_bathrooms')
+            gr_model1(data=data, column='complete_bathrooms', cache=cache)
         with c3:
-            gr_model1(data=data, column='floors')
+            gr_model1(data=data, column='floors', cache=cache)
 
         st.markdown('#### Observations')
         st.markdown('- Most houses have between 2 and 5 bedrooms (97,68%)')
@@ -394,9 +369,9 @@ def set_exploratory_analisys(data, tab):
         # =============== MARKER 2.2 ================
         st.markdown('### 2.2. Time Series: Year Built, Year Renovated and Last Maintenance')
 
-        gr_model1(data = data, column = 'yr_built')
-        gr_model1(data=data.loc[data['yr_renovated']>0], column = 'yr_renovated')
-        gr_model1(data=data, column='last_maintenance')
+        gr_model1(data = data, column = 'yr_built', cache=cache)
+        gr_model1(data=data.loc[data['yr_renovated']>0], column = 'yr_renovated', cache=cache)
+        gr_model1(data=data, column='last_maintenance', cache=cache)
 
         st.markdown('#### Observations')
         st.markdown('- Of 21351, we have 906 reformed houses, which represents 4.24%.')
@@ -417,19 +392,19 @@ def set_exploratory_analisys(data, tab):
             st.header('**3. Quality Variables**')
             c1, c2, c3 = st.columns(3)
             with c1:
-                gr_model1(data=data, column='view')
+                gr_model1(data=data, column='view', cache=cache)
             with c2:
-                gr_model1(data=data, column='condition')
+                gr_model1(data=data, column='condition', cache=cache)
             with c3:
-                gr_model1(data=data, column='grade')
+                gr_model1(data=data, column='grade', cache=cache)
         with container2:
             c1, c2, c3 = st.columns(3)
             with c1:
-                gr_model1(data=data, column='season')
+                gr_model1(data=data, column='season', cache=cache)
             with c2:
-                gr_model1(data=data, column='waterfront')
+                gr_model1(data=data, column='waterfront', cache=cache)
             with c3:
-                gr_model1(data=data, column='half_bathroom')
+                gr_model1(data=data, column='half_bathroom', cache=cache)
 
             st.markdown('''#### Observations
 - Most Houses don't have View (90.15%)
@@ -444,43 +419,82 @@ def set_exploratory_analisys(data, tab):
             st.header('**4.1. Quantity Variables**')
             c1, c2 = st.columns(2)
             with c1:
-                gr_model2(data, column='sqft_living',type = None)
+                gr_model2(data, column='sqft_living',type = None, cache=cache)
             with c2:
-                gr_model2(data, column='sqft_lot',type = None)
+                gr_model2(data, column='sqft_lot',type = None, cache=cache)
         with container4:
             c1, c2 = st.columns(2)
             with c1:
-                gr_model2(data=data.loc[data['sqft_basement']>0], column='sqft_basement',type = None)
+                gr_model2(data=data.loc[data['sqft_basement']>0], column='sqft_basement',type = None, cache=cache)
             with c2:
-                gr_model2(data, column='yr_built',type = None)
+                gr_model2(data, column='yr_built',type = None, cache=cache)
         # =============== MARKER 4.2 ================
         with container5:
             st.header('**4.2. Quality Variables**')
             c1, c2 = st.columns(2)
             with c1:
-                gr_model2(data, column='view',type = 'quality')
+                gr_model2(data, column='view',type = 'quality', cache=cache)
             with c2:
-                gr_model2(data, column='condition',type = 'quality')
+                gr_model2(data, column='condition',type = 'quality', cache=cache)
         with container6:
             c1, c2 = st.columns(2)
             with c1:
-                gr_model2(data, column='waterfront',type = 'quality')
+                gr_model2(data, column='waterfront',type = 'quality', cache=cache)
             with c2:
-                gr_model2(data, column='half_bathroom',type = 'quality')
+                gr_model2(data, column='half_bathroom',type = 'quality', cache=cache)
         # =============== MARKER 4.3 ================
         with container7:
             st.header('**4.3. Correlation By Pearson**')
-            fig, ax = plt.subplots()
-            sns.heatmap(round(data[['sqft_living', 'sqft_lot', 'sqft_basement', 'bedrooms', 'complete_bathrooms', 'floors',
-                              'yr_renovated', 'yr_built', 'last_maintenance', 'price']].corr(method='pearson'),2),
-                        annot=True, ax=ax)
-            st.write(fig)
+            pearson = cached_figure(cache, ('correlation',),
+                                    lambda: correlation.RunningCorrelation(CORRELATION_COLUMNS).update(data))
+            st.image(gr_heatmap(round(pearson.matrix(), 2)))
             st.markdown('''#### Observations
 - Price and sqft_living have a strong positive relation
 - Complete Bathrooms also have a good positive relation, but it should happen because houses with more bathrooms, also have more sqft_living.)''')
     pass
 
-def set_investment_suggest(df_buy,data, tab):
+# rows of the buy list sent to the browser at a time, and rows per chunk of the exports
+PAGE_SIZE = 50
+EXPORT_CHUNK = 1000
+
+# full sorted buy list written chunk by chunk, so the export never holds a second copy of it
+def export_buy(df_buy, ordered, format):
+    buffer = io.BytesIO()
+    chunks = (df_buy.loc[ordered[start:start + EXPORT_CHUNK]] for start in range(0, max(len(ordered), 1), EXPORT_CHUNK))
+    scoring.write_output(chunks, buffer, format)
+    return buffer.getvalue()
+
+# one page of the buy list at a time, sorted on the server with the index permutations;
+# df_buy keeps the row labels of the frame the index was built on
+def set_buy_table(df_buy, index):
+    c1, c2, c3, c4 = st.columns(4)
+    column = c1.selectbox('Sort by', filters.SORT_COLUMNS)
+    ascending = c2.radio('Order', ['Descending', 'Ascending'], horizontal=True) == 'Ascending'
+    pages = max(int(np.ceil(len(df_buy) / PAGE_SIZE)), 1)
+    page = c3.number_input('Page', min_value=1, max_value=pages, value=1)
+    ordered = index.sort(df_buy.index.to_numpy(), column, ascending)
+    start = (page - 1) * PAGE_SIZE
+    st.dataframe(df_buy.loc[ordered[start:start + PAGE_SIZE]], use_container_width=True)
+    st.caption(f'Page {page} of {pages} - {len(df_buy)} houses')
+
+    format = c4.selectbox('Export', ['csv', 'parquet'])
+    if c4.button('Prepare export'):
+        c4.download_button('Download', export_buy(df_buy, ordered, format), file_name=f'houses_to_buy.{format}')
+
+# houses and expected profit over a grid of one threshold, the current value marked
+def gr_sensitivity(criteria, parameter, thresholds):
+    sweep = whatif.sweep(criteria, parameter, **thresholds).reset_index()
+    sweep['expected_profit'] = sweep['expected_profit'] / 1000000
+    rule = alt.Chart(pd.DataFrame({parameter: [thresholds[parameter]]})).mark_rule(color='red').encode(x=parameter)
+    c1, c2 = st.columns(2)
+    for column, title, container in [('houses', 'Houses to Buy', c1), ('expected_profit', 'Expected Profit ($M)', c2)]:
+        line = alt.Chart(sweep).mark_line(point=True).encode(x=alt.X(parameter, title=parameter),
+                                                             y=alt.Y(column, title=title),
+                                                             tooltip=[parameter, column])
+        container.altair_chart(line + rule, use_container_width=True)
+
+@profiling.profiled
+def set_investment_suggest(df_buy,data, tab, index=None, criteria=None, thresholds=None, map_key=None):
 
     with tab:
         container1 = st.container()
@@ -489,7 +503,7 @@ def set_investment_suggest(df_buy,data, tab):
         with container1:
             st.title('📥 Investiment Suggestion')
             # Variables
-            percent_buy = round((len(df_buy) / data.shape[0]) * 100, 2)
+            percent_buy = round((len(df_buy) / max(data.shape[0], 1)) * 100, 2)
             profit = round((df_buy['expected_price'].sum() - df_buy['price'].sum()), 2)
             profit_str = str(round(profit / 100000, 2))
             profit_margin = str(round(((df_buy['expected_price'].mean() / df_buy['price'].mean()-1)*100), 2))
@@ -503,37 +517,107 @@ def set_investment_suggest(df_buy,data, tab):
             c4.metric(label = 'Invested Value',value ='$' + str(value_invested_str+'M'))
             c5.metric(label='Expected Profit', value='$' + profit_str + 'M')
             c6.metric(label = 'Average Profit Margin',value = profit_margin+'%')
-            st.dataframe(df_buy.head(50), use_container_width=True)
+            set_buy_table(df_buy, index or filters.HouseIndex(df_buy))
+            if criteria is not None:
+                with st.expander('Sensitivity'):
+                    parameter = st.selectbox('Threshold', list(whatif.SWEEP))
+                    gr_sensitivity(criteria, parameter, thresholds or whatif.DEFAULTS)
 
         with container2:
             st.title('Suggestion Portfolio')
             st.markdown('')
-            gr_model3(data = df_buy,column='profit')
+            c1, c2, c3 = st.columns(3)
+            houses = c1.radio('Houses', ['Suggested to buy', 'All houses'], horizontal=True)
+            renderer = c2.radio('Renderer', ['plotly', 'pydeck'], horizontal=True)
+            zoom = c3.select_slider('Zoom Level', options=maps.ZOOM_LEVELS, value=10)
+            gr_model3(data = df_buy if houses == 'Suggested to buy' else data, column='profit', zoom=zoom, renderer=renderer,
+                      key = None if map_key is None else (map_key, houses))
+    pass
+
+# sidebar filters of the investment view, the bounds come from all houses
+def set_filters(data):
+    st.sidebar.markdown('#### Filters')
+    zipcodes = st.sidebar.multiselect('Zipcode', list(data['zipcode'].cat.categories))
+    low, high = int(data['price'].min()), int(data['price'].max())
+    price = st.sidebar.slider('Price', low, high, (low, high), step=10000)
+    low, high = int(data['bedrooms'].min()), int(data['bedrooms'].max())
+    bedrooms = st.sidebar.slider('Bedrooms', low, high, (low, high))
+    condition = st.sidebar.multiselect('Condition', list(data['condition'].cat.categories))
+    season = st.sidebar.multiselect('Season', sorted(data['season'].unique()))
+    margin = st.sidebar.slider('Min Profit Margin (%)', 0, 300, 0, step=5)
+    return {'zipcode': zipcodes, 'price': price, 'bedrooms': bedrooms, 'condition': condition, 'season': season,
+            'profit_margin': (margin, np.inf) if margin > 0 else None}
+
+# sidebar buy thresholds, defaulting to the ones of pipeline.ft_buy
+def set_criteria():
+    st.sidebar.markdown('#### Buy Criteria')
+    labels = {'margin': 'Min Expected / Paid Price', 'price_sqft_ratio': 'Max Price per Sqft / Regional',
+              'condition_delta': 'Min Condition over Regional'}
+    return {name: st.sidebar.select_slider(label, options=whatif.SWEEP[name].tolist(), value=whatif.DEFAULTS[name])
+            for name, label in labels.items()}
+
+# hidden panel, opened with ?diagnostics in the url
+def set_diagnostics(data, df_buy, tab, build=None):
+    with tab:
+        st.title('🩺 Diagnostics')
+        st.markdown('#### Pipeline Stages')
+        st.dataframe(profiling.PROFILER.frame(), use_container_width=True)
+        # a market read back from the store skips every pipeline stage, its build timings are stored with it
+        st.markdown('#### Store Build')
+        if build:
+            st.caption('Recorded when the pipeline outputs of this market were built; a warm start reads them '
+                       'back and runs none of these stages.')
+            st.dataframe(pd.DataFrame.from_dict(build, orient='index'), use_container_width=True)
+        else:
+            st.caption('No build timings were recorded for this market.')
+        st.markdown('#### Open Markets')
+        st.dataframe(pd.DataFrame(dataset_registry().report()), use_container_width=True)
+        c1, c2 = st.columns(2)
+        with c1:
+            st.markdown('#### Memory of data')
+            st.dataframe(schema.memory_report(data), use_container_width=True)
+        with c2:
+            st.markdown('#### Memory of df_buy')
+            st.dataframe(schema.memory_report(df_buy), use_container_width=True)
+        with st.expander('JSON'):
+            st.code(profiling.PROFILER.to_json(), language='json')
+        with st.expander('Prometheus'):
+            st.code(profiling.PROFILER.to_prometheus())
     pass
 
 if __name__ == '__main__':
-    path = 'kc_house_data.csv'
-    df = get_data(path)
-    data = cleaning_data(df)
     settings()
-
-    # =============== FEATURES ================
-    data = ft_waterfront(data)
-    data = ft_view(data)
-    data = ft_bathrooms(data)
-    data = ft_grade(data)
-    data = ft_last_maintenance(data)
-    data = ft_season(data)
-    data = ft_price_sqft(data)
-    data = ft_regional_price(data)
-    data = ft_regional_condition(data)
-    data = ft_buy(data)
-    data = ft_condition(data)
-    # =============== DATAFRAMES ================
-    df_buy = ft_df_buy(data)
-
-    # =============== DASHBOARD ================
-    tabs = st.tabs(["🏠 Home", '📈 Data Analisys', "📥 Investiment Suggestion"])
-    set_home(df=df, tab=tabs[0], data=data)
-    set_exploratory_analisys(data, tabs[1])
-    set_investment_suggest(data = data, df_buy= df_buy,tab =  tabs[2])
+    diagnostics = 'diagnostics' in st.experimental_get_query_params()
+    # memory is only traced for the reruns that show the panel
+    with profiling.traced_memory() if diagnostics else contextlib.nullcontext():
+        market = st.sidebar.selectbox('Market', list(dataset_registry().datasets))
+        version = dataset_version(dataset_registry().datasets[market])
+        region = REGIONS[st.sidebar.selectbox('Regional definition', list(REGIONS))]
+        data, df_buy, stats = load_data(market, version, region)
+
+        # =============== DASHBOARD ================
+        # only the selected view runs, its figures are kept per dataset version
+        views = ["🏠 Home", '📈 Data Analisys', "📥 Investiment Suggestion"]
+        view = st.sidebar.radio('Navigation', views)
+        if view == views[0]:
+            set_home(tab=st.container(), data=data)
+        elif view == views[1]:
+            set_exploratory_analisys(data, st.container(), cache=figure_cache(version, region))
+        else:
+            query = set_filters(data)
+            pricing = PRICINGS[st.sidebar.selectbox('Expected price', list(PRICINGS))]
+            thresholds = set_criteria()
+            # the buy list is re-scored from the precomputed criteria of the filtered houses
+            data_index = house_index(version, region, pricing, data)
+            rows = data_index.query(query)
+            criteria = whatif.subset(buy_criteria(version, region, pricing, data), rows)
+            mask = whatif.buy_mask(criteria, **thresholds)
+            buy = data.iloc[rows[mask]][pipeline.BUY_COLUMNS].assign(expected_price=criteria['expected_price'][mask],
+                                                                      profit=criteria['profit'][mask])
+            buy = pipeline.ft_sell(buy, seasonal_prices(version, data))
+            set_investment_suggest(data = data.iloc[rows].assign(**whatif.priced_columns(criteria)), df_buy = buy,
+                                   tab = st.container(), index = data_index, criteria = criteria, thresholds = thresholds,
+                                   map_key = repr((version, region, pricing, query, thresholds)))
+        if diagnostics:
+            set_diagnostics(data, df_buy, tab=st.container(),
+                            build=dataset_registry().stages(market, version, region))
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import profiling
+
+# =============== SETTINGS ================
+# columns queried by value range, through their sorted values
+RANGE_COLUMNS = ['price', 'bedrooms', 'profit_margin']
+# columns queried by value, through one bitmap per category
+CATEGORY_COLUMNS = ['zipcode', 'condition', 'season']
+# columns the result table can be sorted by, through a precomputed permutation
+SORT_COLUMNS = ['profit', 'expected_price', 'price_sqft', 'price', 'date']
+
+# profit over the price paid, in percent
+def profit_margin(expected_price, price):
+    return (np.asarray(expected_price, dtype=np.float64) / np.asarray(price, dtype=np.float64) - 1) * 100
+
+# =============== INDEX ================
+# built once per frame: a range is two searchsorted calls and a category an OR of
+# precomputed packed bitmaps, with no comparison of the column values. Each range still
+# writes a boolean mask of the frame's length and query unpacks one, so a query is O(rows)
+# priced maps columns to the values of another pricing, such as the expected_price and
+# profit of whatif.criteria, which replace those of data in the ranges and sorts
+class HouseIndex:
+    def __init__(self, data, priced=None):
+        priced = priced or {}
+        def values_of(column):
+            return np.asarray(priced[column]) if column in priced else data[column].to_numpy()
+        self.rows = len(data)
+        self.sorted = {}
+        for column in RANGE_COLUMNS:
+            if column == 'profit_margin':
+                values = profit_margin(values_of('expected_price'), values_of('price'))
+            else:
+                values = values_of(column).astype(np.float64)
+            order = np.argsort(values, kind='stable')
+            self.sorted[column] = (values[order], order)
+        self.bitmaps = {}
+        for column in CATEGORY_COLUMNS:
+            codes, categories = pd.factorize(data[column], sort=True)
+            self.bitmaps[column] = {category: np.packbits(codes == code) for code, category in enumerate(categories)}
+        self.orders = {column: np.argsort(values_of(column), kind='stable')
+                       for column in SORT_COLUMNS if column in data or column in priced}
+        self.everything = np.packbits(np.ones(self.rows, dtype=bool))
+        self.nothing = np.zeros_like(self.everything)
+
+    # bitmap of the rows with low <= value <= high, NaN never matches
+    def range(self, column, low, high):
+        values, order = self.sorted[column]
+        start, end = np.searchsorted(values, low, side='left'), np.searchsorted(values, high, side='right')
+        mask = np.zeros(self.rows, dtype=bool)
+        mask[order[start:end]] = True
+        return np.packbits(mask)
+
+    # bitmap of the rows in any of the categories
+    def isin(self, column, categories):
+        bitmap = self.nothing.copy()
+        for category in categories:
+            if category in self.bitmaps[column]:
+                bitmap |= self.bitmaps[column][category]
+        return bitmap
+
+    # =============== QUERY ================
+    # filters maps a column to a (low, high) pair for ranges or to a list of categories;
+    # an empty list or None leaves the column unfiltered. Returns the matching row positions
+    @profiling.profiled
+    def query(self, filters):
+        bitmap = self.everything.copy()
+        for column, value in filters.items():
+            if value is None or (column in self.bitmaps and len(value) == 0):
+                continue
+            if column in self.sorted:
+                bitmap &= self.range(column, *value)
+            else:
+                bitmap &= self.isin(column, value)
+        return np.flatnonzero(np.unpackbits(bitmap, count=self.rows))
+
+    def select(self, data, filters):
+        return data.iloc[self.query(filters)]
+
+    # =============== SORT ================
+    # the row positions in the order of the column: the cached permutation filtered down to
+    # the rows, so a sorted page costs O(n) and no sort at all
+    def sort(self, rows, column, ascending=True):
+        selected = np.zeros(self.rows, dtype=bool)
+        selected[rows] = True
+        order = self.orders[column]
+        order = order[selected[order]]
+        return order if ascending else order[::-1]
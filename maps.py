@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pydeck as pdk
+
+# =============== SETTINGS ================
+# above this many rows the map shows grid clusters instead of one marker per house
+MAX_MARKERS = 2000
+# grid cells per map tile side, a tile spans 360 / 2 ** zoom degrees
+GRID_DETAIL = 4
+ZOOM_LEVELS = list(range(8, 15))
+
+# =============== CLUSTERS ================
+def cell_size(zoom):
+    return 360 / 2 ** (zoom + GRID_DETAIL)
+
+# one row per non-empty grid cell at this zoom: centroid, house count and mean of column
+def cluster(data, column, zoom):
+    size = cell_size(zoom)
+    cell_lat = np.floor(data['lat'].to_numpy() / size).astype(np.int64)
+    cell_long = np.floor(data['long'].to_numpy() / size).astype(np.int64)
+    grouped = data[['lat', 'long', column]].groupby([cell_lat, cell_long])
+    clusters = grouped.agg(lat=('lat', 'mean'), long=('long', 'mean'),
+                           Quantity=('lat', 'size'), **{column: (column, 'mean')})
+    return clusters.reset_index(drop=True)
+
+# =============== PYDECK ================
+def color_scale(values):
+    values = values.astype(np.float64)
+    low, high = np.nanmin(values), np.nanmax(values)
+    share = (values - low) / (high - low) if high > low else np.zeros(len(values))
+    return pd.DataFrame({'r': (255 * share).round().astype(np.uint8),
+                         'g': (80 + 60 * (1 - share)).round().astype(np.uint8),
+                         'b': (255 * (1 - share)).round().astype(np.uint8)}, index=values.index)
+
+# deck.gl scatter layer holding only the columns the layer reads
+def deck(data, column, zoom):
+    layer_data = data[['lat', 'long', column]].join(color_scale(data[column]))
+    # clusters grow with the square root of their house count, in meters
+    if 'Quantity' in data:
+        layer_data['radius'] = cell_size(zoom) * 111000 / 4 * np.sqrt(data['Quantity'])
+    else:
+        layer_data['radius'] = 40
+    layer = pdk.Layer('ScatterplotLayer', data=layer_data,
+                      get_position=['long', 'lat'],
+                      get_fill_color='[r, g, b, 180]',
+                      get_radius='radius',
+                      radius_min_pixels=3,
+                      pickable=True)
+    view = pdk.ViewState(latitude=float(data['lat'].mean()), longitude=float(data['long'].mean()), zoom=zoom)
+    return pdk.Deck(layers=[layer], initial_view_state=view, map_provider='carto',
+                    map_style=pdk.map_styles.CARTO_LIGHT, tooltip={'text': f'{column}: {{{column}}}'})
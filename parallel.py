@@ -0,0 +1,110 @@
+import gc
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import schema
+import regional
+import pipeline
+
+# =============== SETTINGS ================
+WORKERS = 4
+# category order the serial pipeline produces, restored after the shards are merged
+CATEGORY_ORDER = {'waterfront': list(pipeline.WATERFRONT_LABELS.values()),
+                  'view': list(pipeline.VIEW_LABELS.values()),
+                  'condition': list(pipeline.CONDITION_LABELS.values()),
+                  'grade': sorted(pipeline.GRADE_LABELS),
+                  'half_bathroom': ['no', 'yes']}
+
+# =============== ARROW BUFFERS ================
+def to_stream(data):
+    sink = pa.BufferOutputStream()
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+def read_stream(buffer):
+    return pa.ipc.open_stream(buffer).read_all().to_pandas()
+
+# writes a frame as an arrow stream into a shared memory block the workers can map
+def to_shared(data):
+    buffer = to_stream(data)
+    block = shared_memory.SharedMemory(create=True, size=max(buffer.size, 1))
+    block.buf[:buffer.size] = np.frombuffer(buffer, dtype=np.uint8)
+    return block, buffer.size
+
+# =============== SHARDS ================
+# every zipcode lands in exactly one shard, so the regional stats of a shard are final
+def shard_numbers(data, shards):
+    return pd.util.hash_array(data['zipcode'].astype(str).to_numpy()) % shards
+
+def score_stream(buffer):
+    data = read_stream(buffer)
+    data = pipeline.row_features(data)
+    stats = regional.regional_stats(data)
+    data = pipeline.regional_features(data, stats)
+    return to_stream(data).to_pybytes(), to_stream(stats.reset_index()).to_pybytes()
+
+# reads the shard straight from shared memory; the block is detached once
+# nothing built on top of it is left
+def score_shard(name, size):
+    block = shared_memory.SharedMemory(name=name)
+    view = block.buf[:size]
+    buffer = pa.py_buffer(view)
+    try:
+        return score_stream(buffer)
+    except BaseException as error:
+        # the frames of the traceback still hold frames read from the block
+        traceback.clear_frames(error.__traceback__)
+        raise
+    finally:
+        del buffer
+        gc.collect()
+        view.release()
+        block.close()
+
+# =============== MERGE ================
+def canonical_categories(data):
+    for column, order in CATEGORY_ORDER.items():
+        present = set(data[column].cat.categories)
+        data[column] = data[column].cat.reorder_categories([label for label in order if label in present])
+    return data
+
+# same output as pipeline.run_pipeline, with the features computed per zipcode shard
+# on a process pool; shards travel as arrow streams in shared memory
+def run_pipeline(data, workers=WORKERS):
+    data = pipeline.cleaning_data(data)
+    # no zipcode to shard, the serial pipeline gives the empty frames their schema
+    if data.empty:
+        return pipeline.run_pipeline(data)
+    data['row'] = np.arange(len(data))
+    # no more shards than zipcodes, and the empty ones are skipped
+    workers = max(min(workers, data['zipcode'].nunique()), 1)
+    numbers = shard_numbers(data, workers)
+
+    blocks = []
+    try:
+        for shard in range(workers):
+            if (numbers == shard).any():
+                blocks.append(to_shared(data.loc[numbers == shard]))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(score_shard, [block.name for block, _ in blocks],
+                                        [size for _, size in blocks]))
+    finally:
+        for block, _ in blocks:
+            block.close()
+            block.unlink()
+
+    data = schema.concat([read_stream(shard) for shard, _ in results])
+    data = data.sort_values(by='row').drop(columns=['row']).reset_index(drop=True)
+    data = canonical_categories(data)
+    stats = pd.concat([read_stream(shard_stats) for _, shard_stats in results])
+    stats['zipcode'] = stats['zipcode'].astype(data['zipcode'].dtype)
+    # zipcodes in order of first sale, as the serial groupby lists them
+    stats = stats.set_index('zipcode').loc[data['zipcode'].unique()]
+
+    df_buy = pipeline.ft_df_buy(data)
+    return schema.compact(data), schema.compact(df_buy), stats
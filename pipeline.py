@@ -0,0 +1,282 @@
+import numpy as np
+import pandas as pd
+import storage
+import schema
+import regional
+import spatial
+import profiling
+
+# =============== GETING DATA ================
+# reads the memory-mapped feather cache, rebuilt from the csv whenever it changes
+@profiling.profiled
+def get_data(path):
+    data = storage.read_dataset(path)
+    return data
+
+@profiling.profiled
+def cleaning_data(data):
+    data['date'] = pd.to_datetime(data['date'], format=storage.DATE_FORMAT)
+    data = data.sort_values(by='date').drop_duplicates(subset='id', keep='first')
+    data = data.reset_index(drop=True)
+    data['floors'] = round(data['floors'],1)
+    data.loc[data['bedrooms'] == 33].replace({33: 3})
+    return data
+
+# =============== FEATURES ================
+CONDITION_LABELS = {1: 'very bad', 2: 'bad', 3: 'average', 4: 'good', 5: 'excelent'}
+WATERFRONT_LABELS = {0: 'no', 1: 'yes'}
+VIEW_LABELS = {0: 'no view', 1: 'bad', 2: 'average', 3: 'good', 4: 'excelent'}
+GRADE_LABELS = ['very poor', 'poor', 'average', 'good', 'excelent', 'na']
+
+@profiling.profiled
+def ft_waterfront(data):
+    data['waterfront'] = pd.Categorical(data['waterfront'])
+    data['waterfront'] = data['waterfront'].cat.rename_categories(WATERFRONT_LABELS)
+    return data
+
+@profiling.profiled
+def ft_condition(data):
+    data['condition'] = pd.Categorical(data['condition'])
+    data['condition'] = data['condition'].cat.rename_categories(CONDITION_LABELS)
+    return data
+
+@profiling.profiled
+def ft_view(data):
+    data['view'] = pd.Categorical(data['view'])
+    data['view'] = data['view'].cat.rename_categories(VIEW_LABELS)
+    return data
+
+@profiling.profiled
+def ft_grade(data):
+    data['grade'] = pd.cut(data['grade'], bins=[-np.inf, 3, 5, 8, 10, 13, np.inf],
+                           labels=GRADE_LABELS, ordered=False)
+    # alphabetical categories, as pd.Categorical gave them to the charts before
+    data['grade'] = data['grade'].cat.remove_unused_categories()
+    data['grade'] = data['grade'].cat.reorder_categories(sorted(data['grade'].cat.categories))
+    return data
+
+# season start dates as month * 100 + day:
+# spring on March 21st, summer on June 21st, fall on September 23rd and winter on December 21st
+def season(month, day):
+    month_day = np.asarray(month) * 100 + np.asarray(day)
+    return np.select([(month_day < 321) | (month_day >= 1221), month_day < 621, month_day < 923],
+                     ['winter', 'spring', 'summer'], default='fall')
+
+@profiling.profiled
+def ft_season(data):
+    data['season'] = season(month=data['date'].dt.month, day=data['date'].dt.day)
+    return data
+
+@profiling.profiled
+def ft_bathrooms(data):
+    data['complete_bathrooms'] = np.floor(data['bathrooms']).astype(np.int64)
+    data['half_bathroom'] = pd.Categorical(np.where(data['bathrooms'] % 1 == 0, 'no', 'yes'))
+    data = data.loc[data['complete_bathrooms'] != 0]
+    data = data.drop(columns=['bathrooms'])
+    data = data.reset_index(drop=True)
+    return data
+
+def last_maintenance(built, renovated):
+    return np.where(renovated == 0, built, renovated)
+
+@profiling.profiled
+def ft_last_maintenance(data):
+    data['last_maintenance'] = last_maintenance(built=data['yr_built'], renovated=data['yr_renovated'])
+    return data
+
+@profiling.profiled
+def ft_price_sqft(data):
+    data['price_sqft'] = round(data['price'] / data['sqft_living'],2)
+    return data
+
+@profiling.profiled
+def ft_regional_condition(data, stats):
+    data['regional_condition'] = regional.lookup(data, stats, 'regional_condition')
+    return data
+
+@profiling.profiled
+def ft_regional_price(data, stats):
+    data['regional_price_sqft'] = regional.lookup(data, stats, 'regional_price_sqft')
+    data['expected_price'] = round(data['regional_price_sqft'] * data['sqft_living'], 2)
+    data['profit'] = round(data['expected_price'] - data['price'],2)
+
+    return data
+
+# expected price from a fitted valuation model, such as valuation.ZipcodeRidge,
+# in place of the regional price per sqft
+@profiling.profiled
+def ft_model_price(data, model):
+    data['expected_price'] = round(model.predict(data), 2)
+    data['profit'] = round(data['expected_price'] - data['price'],2)
+    return data
+
+# =============== NEIGHBOURHOOD ================
+# regional definition used by run_pipeline: the house's zipcode, or its nearest neighbours
+REGION = 'zipcode'
+# same count as sqft_living15 and sqft_lot15; a radius in km replaces it when set
+NEIGHBORS = 15
+NEIGHBOR_RADIUS = None
+
+# regional price and condition from the houses around each house instead of its zipcode:
+# median price per sqft of the neighbours, which is robust with few of them, and their mean condition
+@profiling.profiled
+def ft_neighbor_region(data, k=NEIGHBORS, radius=NEIGHBOR_RADIUS):
+    neighbors = spatial.neighbor_stats(data, k=None if radius else k, radius=radius)
+    data['regional_price_sqft'] = round(neighbors['neighbor_median_price_sqft'], 2)
+    data['expected_price'] = round(data['regional_price_sqft'] * data['sqft_living'], 2)
+    data['profit'] = round(data['expected_price'] - data['price'],2)
+    data['regional_condition'] = neighbors['neighbor_condition']
+    return data
+
+# =============== BUY CRITERIA ================
+# expected over paid price, price per sqft over the regional one and condition over the regional one
+MARGIN = 1.6
+PRICE_SQFT_RATIO = 1.0
+CONDITION_DELTA = 0
+
+@profiling.profiled
+def ft_buy(data, margin=MARGIN, price_sqft_ratio=PRICE_SQFT_RATIO, condition_delta=CONDITION_DELTA):
+    data['buy'] = np.where((data['price_sqft'] < data['regional_price_sqft'] * price_sqft_ratio) &  # sqft price bellow market
+                           (data['regional_condition'] + condition_delta < data['condition']) &  # Regional Condition
+                           ((data['expected_price'] / data['price']) > margin),  # Margin Profit greater than 60%
+                           'yes', 'no')
+    return data
+
+# =============== Data Frames ================
+BUY_COLUMNS = ['id', 'date','season', 'price','expected_price','profit','price_sqft', 'regional_price_sqft',
+        'complete_bathrooms', 'half_bathroom', 'bedrooms', 'floors', 'sqft_living', 'sqft_above','sqft_basement', 'sqft_lot',
+       'view', 'condition', 'grade','waterfront', 'yr_built', 'yr_renovated','last_maintenance', 'zipcode', 'lat', 'long']
+
+# filters the houses to buy
+@profiling.profiled
+def ft_df_buy(data):
+    data = data.loc[(data['buy'] == 'yes') & (data['condition'] != 'bad')].copy()
+    data = data[BUY_COLUMNS]
+    data = data.reset_index(drop = True)
+    return data
+
+# =============== SELLING ================
+# when and for how much to sell: the season with the highest median price per sqft in the zipcode
+@profiling.profiled
+def ft_sell(data, prices):
+    data['sell_season'] = regional.lookup(data, prices, 'sell_season')
+    data['sell_price'] = round(regional.lookup(data, prices, 'sell_price_sqft') * data['sqft_living'], 2)
+    data['sell_profit'] = round(data['sell_price'] - data['price'], 2)
+    return data
+
+# =============== PIPELINE ================
+# features that only depend on the row itself
+def row_features(data):
+    data = ft_waterfront(data)
+    data = ft_view(data)
+    data = ft_bathrooms(data)
+    data = ft_grade(data)
+    data = ft_last_maintenance(data)
+    data = ft_season(data)
+    data = ft_price_sqft(data)
+    return data
+
+# features that depend on the per-zipcode stats, and the buy decision
+def regional_features(data, stats, model=None):
+    data = ft_regional_price(data, stats)
+    data = ft_regional_condition(data, stats)
+    if model is not None:
+        data = ft_model_price(data, model)
+    data = ft_buy(data)
+    data = ft_condition(data)
+    return data
+
+# same features with the regional price and condition taken from the nearest neighbours
+def neighbor_features(data, model=None):
+    data = ft_neighbor_region(data)
+    if model is not None:
+        data = ft_model_price(data, model)
+    data = ft_buy(data)
+    data = ft_condition(data)
+    return data
+
+# region is 'zipcode' or 'neighbors'; the per-zipcode stats are returned either way.
+# A valuation model prices expected_price when given, an unfitted one is fitted on the rows first.
+# A dropped dict gets the sales ft_bathrooms removes, for append_data
+@profiling.profiled
+def run_pipeline(data, region=REGION, model=None, dropped=None):
+    data = cleaning_data(data)
+    if dropped is not None:
+        dropped.update(dropped_sales(data))
+
+    # =============== FEATURES ================
+    data = row_features(data)
+    stats = regional.regional_stats(data)
+    if model is not None and not model.fitted:
+        model.fit(data)
+    if region == 'neighbors':
+        data = neighbor_features(data, model)
+    else:
+        data = regional_features(data, stats, model)
+    # =============== DATAFRAMES ================
+    df_buy = ft_df_buy(data)
+    return schema.compact(data), schema.compact(df_buy), stats
+
+# =============== INCREMENTAL ================
+# numeric condition back from its labels, as ft_buy and the regional sums need it
+def condition_score(data):
+    data = data.copy()
+    scores = {label: score for score, label in CONDITION_LABELS.items()}
+    data['condition'] = data['condition'].map(scores).astype(np.int64)
+    return data
+
+# first sales that ft_bathrooms drops for having no complete bathroom, as id -> date
+def dropped_sales(data):
+    rows = data.loc[np.floor(data['bathrooms']) == 0]
+    return dict(zip(rows['id'], rows['date']))
+
+# columns of the stored rows that change when the stats of their zipcode do
+REGIONAL_COLUMNS = ['regional_price_sqft', 'expected_price', 'profit', 'regional_condition', 'buy']
+
+# appends a batch of new sales, read in any way, to the output of run_pipeline with the zipcode region:
+# only the new rows get their row-local features, the zipcode sums are updated and ft_buy runs again
+# for the rows and df_buy entries of the affected zipcodes; the other rows are left as they are and
+# the new ones go at the end. The valuation model of run_pipeline, if any, gets the same rows added
+# and removed, and the dropped dict of run_pipeline keeps the dedup-by-id rule for the sales it holds
+@profiling.profiled
+def append_data(data, df_buy, stats, batch, model=None, dropped=None):
+    batch = cleaning_data(storage.conform(batch))
+    # cleaning_data keeps the first sale of each id, so a stored id is only replaced by an earlier sale
+    stored = data.loc[data['id'].isin(batch['id']), ['id', 'date']]
+    previous = batch['id'].map(pd.Series(stored['date'].to_numpy(), index=stored['id'].to_numpy()))
+    if dropped:
+        previous = previous.fillna(batch['id'].map(pd.Series(dropped, dtype='datetime64[ns]')))
+    batch = batch.loc[previous.isna() | (batch['date'] < previous)]
+    if dropped is not None:
+        for sale in set(batch['id']) & set(dropped):
+            del dropped[sale]
+        dropped.update(dropped_sales(batch))
+    if len(batch) == 0:
+        return data, df_buy, stats
+
+    replaced = data['id'].isin(batch['id']).to_numpy()
+    removed = condition_score(data.loc[replaced])
+    if replaced.any():
+        data = data.loc[~replaced].reset_index(drop=True)
+
+    batch = row_features(batch)
+
+    zipcodes = set(batch['zipcode']) | set(removed['zipcode'])
+    affected = np.flatnonzero(data['zipcode'].isin(zipcodes).to_numpy())
+    rows = schema.concat([condition_score(data.iloc[affected][batch.columns]), batch])
+    stats = regional.update_stats(stats, rows, added=batch, removed=removed)
+    if model is not None:
+        model.update(removed, sign=-1, solve=False)
+        model.update(batch)
+    rows = regional_features(rows, stats, model)
+
+    later = len(data) == 0 or len(batch) == 0 or batch['date'].min() >= data['date'].max()
+    data = schema.concat([data, rows.iloc[len(affected):][data.columns]])
+    for column in REGIONAL_COLUMNS:
+        data.iloc[affected, data.columns.get_loc(column)] = rows[column].iloc[:len(affected)].to_numpy()
+    if not later:
+        data = data.sort_values(by='date', kind='mergesort').reset_index(drop=True)
+
+    df_buy = schema.concat([df_buy.loc[~df_buy['zipcode'].isin(zipcodes)], ft_df_buy(rows)])
+    df_buy = df_buy.sort_values(by='date', kind='mergesort').reset_index(drop=True)
+    return data, df_buy, stats
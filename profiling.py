@@ -0,0 +1,138 @@
+import json
+import time
+import functools
+import threading
+import tracemalloc
+from contextlib import contextmanager
+import pandas as pd
+
+# =============== SETTINGS ================
+ENABLED = True
+METRIC_PREFIX = 'house_rocket_stage'
+METRICS = {'wall_seconds': 'wall', 'cpu_seconds': 'cpu', 'peak_memory_bytes': 'peak_memory', 'rows': 'rows'}
+
+# =============== PROFILER ================
+# last wall time, cpu time, peak memory and row count of every stage, plus call totals.
+# tracemalloc is one per process while sessions run as threads, so peak memory is only
+# measured by the thread inside traced_memory, one thread at a time; the stages of the other
+# threads record none instead of resetting its peak
+class Profiler:
+    def __init__(self):
+        self.records = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.trace_lock = threading.RLock()
+        self.tracing_thread = None
+
+    def reset(self):
+        with self.lock:
+            self.records = {}
+
+    def record(self, name, wall, cpu, peak_memory, rows):
+        with self.lock:
+            entry = self.records.setdefault(name, {'calls': 0, 'wall_total': 0.0, 'cpu_total': 0.0})
+            entry['calls'] += 1
+            entry['wall_total'] += wall
+            entry['cpu_total'] += cpu
+            entry.update(wall=wall, cpu=cpu, peak_memory=peak_memory, rows=rows)
+
+    # yields a dict where the caller can set 'rows'
+    @contextmanager
+    def stage(self, name, rows=None):
+        info = {'rows': rows, 'peak': 0}
+        stack = self.local.__dict__.setdefault('stack', [])
+        tracing = self.measures_memory()
+        if tracing:
+            start_memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        stack.append(info)
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield info
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.thread_time() - cpu
+            stack.pop()
+            peak_memory = None
+            if tracing and self.measures_memory():
+                # nested stages reset the peak, so they report theirs to the enclosing stage
+                peak = max(tracemalloc.get_traced_memory()[1], info['peak'])
+                peak_memory = max(peak - start_memory, 0)
+                if stack:
+                    stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+            self.record(name, wall, cpu, peak_memory, info['rows'])
+
+    def measures_memory(self):
+        return self.tracing_thread == threading.get_ident() and tracemalloc.is_tracing()
+
+    # traces allocations for the body only; a trace started by someone else is left running.
+    # Other threads wait for the body, as the peaks of both would mix
+    @contextmanager
+    def traced_memory(self):
+        with self.trace_lock:
+            started = not tracemalloc.is_tracing()
+            if started:
+                tracemalloc.start()
+            previous, self.tracing_thread = self.tracing_thread, threading.get_ident()
+            try:
+                yield
+            finally:
+                self.tracing_thread = previous
+                if started:
+                    tracemalloc.stop()
+
+    def snapshot(self):
+        with self.lock:
+            return {name: dict(entry) for name, entry in self.records.items()}
+
+    # records of the stages that ran since the snapshot was taken
+    def since(self, snapshot):
+        return {name: entry for name, entry in self.snapshot().items()
+                if entry['calls'] != snapshot.get(name, {}).get('calls')}
+
+    # =============== OUTPUT ================
+    def frame(self):
+        return pd.DataFrame.from_dict(self.snapshot(), orient='index')
+
+    def to_json(self):
+        with self.lock:
+            return json.dumps(self.records, indent=2)
+
+    def to_prometheus(self):
+        records = self.snapshot()
+        lines = []
+        for metric, field in METRICS.items():
+            lines.append(f'# TYPE {METRIC_PREFIX}_{metric} gauge')
+            for name, entry in records.items():
+                if entry[field] is not None:
+                    lines.append(f'{METRIC_PREFIX}_{metric}{{stage="{name}"}} {entry[field]}')
+        lines.append(f'# TYPE {METRIC_PREFIX}_calls_total counter')
+        for name, entry in records.items():
+            lines.append(f'{METRIC_PREFIX}_calls_total{{stage="{name}"}} {entry["calls"]}')
+        return '\n'.join(lines) + '\n'
+
+PROFILER = Profiler()
+
+# =============== HELPERS ================
+def stage(name, rows=None):
+    return PROFILER.stage(name, rows)
+
+def row_count(result):
+    if isinstance(result, tuple) and result:
+        result = result[0]
+    return len(result) if isinstance(result, pd.DataFrame) else None
+
+# records every call of the decorated function as a stage named after it
+def profiled(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not ENABLED:
+            return func(*args, **kwargs)
+        with stage(func.__name__) as info:
+            result = func(*args, **kwargs)
+            info['rows'] = row_count(result)
+        return result
+    return wrapper
+
+# tracemalloc slows every allocation of the process, so it only traces the body
+def traced_memory():
+    return PROFILER.traced_memory()
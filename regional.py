@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import profiling
+
+# =============== SETTINGS ================
+PROFIT_QUANTILES = [0.25, 0.5, 0.75]
+# running totals kept next to the means, so appended rows update them exactly
+SUM_COLUMNS = ['regional_count', 'price_sqft_sum', 'condition_sum']
+
+# =============== STATISTICS ================
+# every per-zipcode aggregate in one grouped pass over the row-local features,
+# the profit quantiles reuse the same grouping once the expected price is known
+@profiling.profiled
+def regional_stats(data, key='zipcode'):
+    grouped = data.groupby(key, observed=True)
+    stats = grouped.agg(regional_price_sqft=('price_sqft', 'mean'),
+                        regional_median_price_sqft=('price_sqft', 'median'),
+                        regional_condition=('condition', 'mean'),
+                        regional_median_condition=('condition', 'median'),
+                        regional_count=('price_sqft', 'size'),
+                        price_sqft_sum=('price_sqft', 'sum'),
+                        condition_sum=('condition', 'sum'))
+
+    expected_price = round(lookup(data, stats, 'regional_price_sqft', key) * data['sqft_living'], 2)
+    profit = round(expected_price - data['price'], 2)
+    # reindexed, as an empty frame unstacks without the quantile columns
+    quantiles = profit.groupby(data[key], observed=True).quantile(PROFIT_QUANTILES).unstack()
+    quantiles = quantiles.reindex(columns=PROFIT_QUANTILES)
+    quantiles.columns = [f'regional_profit_q{int(q * 100)}' for q in PROFIT_QUANTILES]
+    return stats.join(quantiles)
+
+# =============== INCREMENTAL ================
+def sums(data, key='zipcode'):
+    grouped = data.groupby(key, observed=True)
+    return grouped.agg(regional_count=('price_sqft', 'size'),
+                       price_sqft_sum=('price_sqft', 'sum'),
+                       condition_sum=('condition', 'sum'))
+
+# the mean-only stats table that ft_buy needs, from sums gathered over chunks
+def stats_from_sums(totals):
+    stats = totals.copy()
+    stats['regional_price_sqft'] = stats['price_sqft_sum'] / stats['regional_count']
+    stats['regional_condition'] = stats['condition_sum'] / stats['regional_count']
+    return stats
+
+# updates the means from the running sums of added and removed rows; medians and
+# quantiles can't be kept that way, so they are recomputed from the rows of the
+# affected zipcodes only
+def update_stats(stats, rows, added, removed, key='zipcode'):
+    delta = sums(added, key).sub(sums(removed, key), fill_value=0)
+    stats = stats.copy()
+    stats.index = stats.index.astype(object)
+    delta.index = delta.index.astype(object)
+    stats = stats.reindex(stats.index.union(delta.index))
+    stats[SUM_COLUMNS] = stats[SUM_COLUMNS].add(delta, fill_value=0)
+    stats = stats.loc[stats['regional_count'] > 0].copy()
+    stats['regional_count'] = stats['regional_count'].astype(np.int64)
+    means = ['regional_price_sqft', 'regional_condition']
+    stats[means] = stats_from_sums(stats[SUM_COLUMNS])[means]
+
+    refreshed = regional_stats(rows, key)
+    refreshed.index = refreshed.index.astype(object)
+    columns = [column for column in refreshed.columns if column not in SUM_COLUMNS + means]
+    stats.loc[refreshed.index, columns] = refreshed[columns]
+    return stats
+
+# =============== SEASONAL ================
+SEASONS = ['spring', 'summer', 'fall', 'winter']
+
+# median price per sqft of every zipcode in every season in one grouped pass, plus the
+# season that sells highest in the zipcode and its median price per sqft
+@profiling.profiled
+def seasonal_prices(data, key='zipcode'):
+    table = data.groupby([key, 'season'], observed=True)['price_sqft'].median().unstack('season')
+    table.columns = table.columns.astype(str)
+    table = table[[season for season in SEASONS if season in table.columns]]
+    medians = table.to_numpy(dtype=np.float64)
+    best = np.nanargmax(medians, axis=1)
+    table['sell_season'] = table.columns[best]
+    table['sell_price_sqft'] = medians[np.arange(len(table)), best]
+    return table
+
+# =============== BROADCAST ================
+# maps a stats column back onto the rows through an index lookup instead of a merge
+def lookup(data, stats, column, key='zipcode'):
+    position = stats.index.get_indexer(data[key])
+    values = stats[column].to_numpy()[position]
+    return pd.Series(np.where(position >= 0, values, np.nan), index=data.index, name=column)
@@ -0,0 +1,128 @@
+import os
+import glob
+import json
+import threading
+from collections import OrderedDict
+import pyarrow as pa
+import pyarrow.feather as feather
+import storage
+import pipeline
+import parallel
+import profiling
+
+# =============== SETTINGS ================
+# market name -> source csv; every csv in MARKETS_DIR is added under its file name
+DATASETS = {'King County': 'kc_house_data.csv'}
+MARKETS_DIR = 'markets'
+# bytes of pipeline outputs kept open at once, the least recently used market is closed first
+MEMORY_BUDGET = 2 * 1024 ** 3
+FRAMES = ['data', 'df_buy', 'stats']
+# raised whenever the pipeline output changes, so the stores built by older code are rebuilt
+OUTPUT_VERSION = 2
+
+def discover(directory=MARKETS_DIR):
+    datasets = dict(DATASETS)
+    for path in sorted(glob.glob(os.path.join(directory, '*.csv'))):
+        name = os.path.splitext(os.path.basename(path))[0].replace('_', ' ').title()
+        datasets[name] = path
+    return datasets
+
+# =============== STORE ================
+# pipeline outputs sit next to the csv cache as uncompressed feather files named after the
+# csv version, the output version and the regional definition, so any process maps the same pages
+def store_prefix(path, region):
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(os.path.dirname(path), storage.CACHE_DIR, f'{name}-{region}-')
+
+def store_path(path, version, region, frame, extension='feather'):
+    return store_prefix(path, region) + f'{version[:16]}-v{OUTPUT_VERSION}-{frame}.{extension}'
+
+def write_frame(data, target):
+    storage.write_cache(pa.Table.from_pandas(data), target)
+
+# numeric columns come back as read-only views of the mapped file
+def read_frame(target):
+    return feather.read_table(target, memory_map=True).to_pandas(split_blocks=True)
+
+# profiler records of the run that built the store, the stages do not run again on a warm start
+def read_stages(path, version, region=pipeline.REGION):
+    target = store_path(path, version, region, 'stages', 'json')
+    if not os.path.exists(target):
+        return {}
+    with open(target) as f:
+        return json.load(f)
+
+# runs the pipeline once per csv version and regional definition, and drops the
+# files of older versions
+def build(path, version, region=pipeline.REGION, workers=1):
+    targets = [store_path(path, version, region, frame) for frame in FRAMES]
+    if not all(os.path.exists(target) for target in targets):
+        before = profiling.PROFILER.snapshot()
+        data = pipeline.get_data(path)
+        if workers > 1 and region == 'zipcode':
+            frames = parallel.run_pipeline(data, workers=workers)
+        else:
+            frames = pipeline.run_pipeline(data, region=region)
+        for frame, target in zip(frames, targets):
+            write_frame(frame, target)
+        stages = store_path(path, version, region, 'stages', 'json')
+        with storage.replacing(stages) as tmp, open(tmp, 'w') as f:
+            json.dump(profiling.PROFILER.since(before), f, indent=2)
+        # temp files belong to the builds of other processes
+        for stale in glob.glob(store_prefix(path, region) + '*'):
+            if stale not in targets + [stages] and not stale.endswith('.tmp'):
+                os.remove(stale)
+    return tuple(read_frame(target) for target in targets)
+
+# =============== REGISTRY ================
+# one read-only copy of every open market shared by all the sessions of the process. The
+# registry lock only guards the table of open markets; a build holds the lock of its own key,
+# so sessions opening the same market wait for one build and other markets open meanwhile
+class Registry:
+    def __init__(self, datasets=None, budget=MEMORY_BUDGET):
+        self.datasets = discover() if datasets is None else dict(datasets)
+        self.budget = budget
+        self.loaded = OrderedDict()
+        self.lock = threading.Lock()
+        self.building = {}
+
+    def cached(self, key):
+        with self.lock:
+            if key in self.loaded:
+                self.loaded.move_to_end(key)
+                return self.loaded[key]['frames']
+            return None
+
+    def load(self, name, version, region=pipeline.REGION, workers=1):
+        key = (name, version, region)
+        frames = self.cached(key)
+        if frames is not None:
+            return frames
+        with self.lock:
+            building = self.building.setdefault(key, threading.Lock())
+        with building:
+            frames = self.cached(key)
+            if frames is not None:
+                return frames
+            try:
+                frames = build(self.datasets[name], version, region, workers)
+                size = sum(int(frame.memory_usage(deep=True).sum()) for frame in frames)
+                with self.lock:
+                    self.loaded[key] = {'frames': frames, 'bytes': size}
+                    self.evict()
+            finally:
+                with self.lock:
+                    self.building.pop(key, None)
+            return frames
+
+    def stages(self, name, version, region=pipeline.REGION):
+        return read_stages(self.datasets[name], version, region)
+
+    # the market just opened always stays, even when it alone is over the budget
+    def evict(self):
+        while len(self.loaded) > 1 and sum(entry['bytes'] for entry in self.loaded.values()) > self.budget:
+            self.loaded.popitem(last=False)
+
+    def report(self):
+        return [{'market': name, 'version': version[:16], 'region': region, 'MB': round(entry['bytes'] / 1024 ** 2, 2)}
+                for (name, version, region), entry in self.loaded.items()]
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+# =============== SETTINGS ================
+# object columns with at most this share of distinct values become categorical
+CATEGORY_RATIO = 0.5
+
+# =============== DTYPES ================
+def compact_column(column):
+    if pd.api.types.is_bool_dtype(column) or pd.api.types.is_categorical_dtype(column):
+        return column
+    if pd.api.types.is_integer_dtype(column):
+        return pd.to_numeric(column, downcast='integer')
+    if pd.api.types.is_float_dtype(column):
+        if column.hasnans:
+            return column
+        # whole-number floats (e.g. price) are stored as integers, others only lose
+        # their width when every value survives the round trip
+        if (column % 1 == 0).all():
+            return pd.to_numeric(column.astype(np.int64), downcast='integer')
+        narrow = column.astype(np.float32)
+        if (narrow.astype(np.float64) == column).all():
+            return narrow
+        return column
+    if pd.api.types.is_object_dtype(column):
+        if column.nunique() <= len(column) * CATEGORY_RATIO:
+            return column.astype('category')
+    return column
+
+# downcasts every column to the smallest dtype that keeps its values unchanged
+def compact(data):
+    return pd.DataFrame({column: compact_column(data[column]) for column in data.columns})
+
+# concatenates frames keeping categorical columns categorical, with the
+# categories of the first frame first
+def concat(frames):
+    frames = [frame for frame in frames if len(frame)] or frames[:1]
+    columns = {}
+    for column in frames[0].columns:
+        parts = [frame[column] for frame in frames]
+        if any(pd.api.types.is_categorical_dtype(part) for part in parts):
+            parts = [part.astype('category') for part in parts]
+            columns[column] = pd.Series(pd.api.types.union_categoricals(parts), name=column)
+        else:
+            columns[column] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(columns)
+
+# =============== REPORT ================
+def memory_report(data):
+    report = pd.DataFrame({'dtype': data.dtypes.astype(str),
+                           'bytes': data.memory_usage(index=False, deep=True)})
+    report['share'] = round(report['bytes'] / report['bytes'].sum() * 100, 2)
+    return report.sort_values(by='bytes', ascending=False)
@@ -0,0 +1,119 @@
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import storage
+import schema
+import regional
+import pipeline
+
+# =============== SETTINGS ================
+CHUNK_SIZE = 100000
+WORKERS = 1
+# columns the first pass needs to dedup ids and sum the regional stats
+FIRST_PASS_COLUMNS = ['id', 'date', 'price', 'bathrooms', 'sqft_living', 'condition', 'zipcode']
+
+# =============== READING ================
+# chunks keep the global row number as their index
+def read_chunks(path, chunk_size, columns=None):
+    dtypes = {column: dtype for column, dtype in storage.DTYPES.items() if columns is None or column in columns}
+    for chunk in pd.read_csv(path, dtype=dtypes, usecols=columns, chunksize=chunk_size):
+        yield storage.conform(chunk)
+
+# =============== FIRST PASS ================
+# marks the rows cleaning_data would keep (the first sale of each id) and sums the
+# regional stats over the kept rows that have a complete bathroom
+def first_pass(path, chunk_size):
+    parts = []
+    for chunk in read_chunks(path, chunk_size, FIRST_PASS_COLUMNS):
+        parts.append(pd.DataFrame({'id': chunk['id'], 'date': chunk['date'], 'zipcode': chunk['zipcode'],
+                                   'price_sqft': round(chunk['price'] / chunk['sqft_living'], 2),
+                                   'condition': chunk['condition'].astype(np.int8),
+                                   'complete': chunk['bathrooms'] >= 1}))
+    rows = schema.concat(parts)
+
+    first = rows.sort_values(by='date', kind='mergesort').drop_duplicates(subset='id', keep='first').index
+    keep = np.zeros(len(rows), dtype=bool)
+    keep[first] = True
+
+    totals = regional.sums(rows.loc[keep & rows['complete'].to_numpy()])
+    totals.index = totals.index.astype(object)
+    return keep, regional.stats_from_sums(totals)
+
+# =============== SECOND PASS ================
+def score_chunk(chunk, stats):
+    data = pipeline.cleaning_data(chunk)
+    data = pipeline.row_features(data)
+    data = pipeline.regional_features(data, stats)
+    return pipeline.ft_df_buy(data)
+
+# scores the chunks on up to `workers` processes, keeping at most two chunks per
+# worker in flight and yielding results in input order
+def second_pass(path, chunk_size, keep, stats, workers):
+    chunks = (chunk.loc[keep[chunk.index]].copy() for chunk in read_chunks(path, chunk_size))
+    if workers <= 1:
+        for chunk in chunks:
+            yield score_chunk(chunk, stats)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(score_chunk, chunk, stats))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+# =============== OUTPUT ================
+def plain(data):
+    return data.astype({column: data[column].cat.categories.dtype
+                        for column in data.select_dtypes('category').columns})
+
+# output is a path, or a binary buffer when the format is given
+def write_output(frames, output, format=None):
+    format = format or ('parquet' if output.endswith('.parquet') else 'csv')
+    total = 0
+    if format == 'parquet':
+        writer, last = None, None
+        for frame in frames:
+            last = frame
+            # chunks without candidates can't tell the column types, the first non-empty one sets the schema
+            if len(frame) == 0:
+                continue
+            table = pa.Table.from_pandas(plain(frame), preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(output, table.schema)
+            writer.write_table(table.cast(writer.schema))
+            total += len(frame)
+        if writer is not None:
+            writer.close()
+        elif last is not None:
+            plain(last).to_parquet(output, index=False)
+    else:
+        for number, frame in enumerate(frames):
+            frame.to_csv(output, mode='w' if number == 0 else 'a', header=number == 0, index=False)
+            total += len(frame)
+    return total
+
+def score(path, output, chunk_size=CHUNK_SIZE, workers=WORKERS):
+    keep, stats = first_pass(path, chunk_size)
+    return write_output(second_pass(path, chunk_size, keep, stats, workers), output)
+
+# =============== CLI ================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Scores a house sales csv with the House Rocket buy criteria '
+                                                 'and writes the houses to buy.')
+    parser.add_argument('input', help='csv in the kc_house_data.csv schema')
+    parser.add_argument('-o', '--output', default='df_buy.parquet', help='.parquet or .csv file to write')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='rows read per chunk')
+    parser.add_argument('--workers', type=int, default=WORKERS, help='processes scoring chunks')
+    args = parser.parse_args(argv)
+
+    total = score(args.input, args.output, chunk_size=args.chunk_size, workers=args.workers)
+    print(f'{total} houses to buy written to {args.output}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+# =============== SETTINGS ================
+# km per degree of latitude, and of longitude at the equator
+KM_PER_DEGREE = 110.574
+KM_PER_DEGREE_LONG = 111.320
+
+# =============== INDEX ================
+# houses bucketed on a square grid of `cell_size` km over an equirectangular projection;
+# a query only looks at the rings of cells around its own, which keeps it O(n log n)
+class GridIndex:
+    def __init__(self, lat, long, cell_size):
+        lat, long = np.asarray(lat, dtype=np.float64), np.asarray(long, dtype=np.float64)
+        self.x = long * KM_PER_DEGREE_LONG * np.cos(np.radians(lat.mean() if len(lat) else 0))
+        self.y = lat * KM_PER_DEGREE
+        self.cell_size = cell_size
+        cells_x = np.floor(self.x / cell_size).astype(np.int64)
+        cells_y = np.floor(self.y / cell_size).astype(np.int64)
+
+        self.order = np.lexsort((cells_y, cells_x))
+        keys = np.stack([cells_x[self.order], cells_y[self.order]], axis=1)
+        self.cells, starts = np.unique(keys, axis=0, return_index=True)
+        ends = np.append(starts[1:], len(self.order))
+        self.slices = {(cx, cy): (start, end) for (cx, cy), start, end in zip(self.cells.tolist(), starts, ends)}
+
+    # grid sized so that a cell holds about `k` houses on average
+    @classmethod
+    def for_neighbors(cls, lat, long, k):
+        lat, long = np.asarray(lat), np.asarray(long)
+        width = np.ptp(long) * KM_PER_DEGREE_LONG * np.cos(np.radians(lat.mean()))
+        height = np.ptp(lat) * KM_PER_DEGREE
+        return cls(lat, long, max(np.sqrt(width * height * k / max(len(lat), 1)), 0.01))
+
+    def members(self, cell):
+        start, end = self.slices[cell]
+        return self.order[start:end]
+
+    # houses in the cells at most `ring` cells away from `cell`
+    def candidates(self, cell, ring):
+        cx, cy = cell
+        found = [self.members((x, y)) for x in range(cx - ring, cx + ring + 1) for y in range(cy - ring, cy + ring + 1)
+                 if (x, y) in self.slices]
+        return np.concatenate(found)
+
+    # yields, per occupied cell, its houses, their neighbour candidates and the distance matrix
+    # between them; the house itself is at infinite distance so it never counts as its own neighbour
+    def blocks(self, ring_for):
+        for cell in map(tuple, self.cells.tolist()):
+            queries = self.members(cell)
+            ring = ring_for(queries, cell, None)
+            while True:
+                candidates = self.candidates(cell, ring)
+                distance = np.hypot(self.x[queries, None] - self.x[candidates], self.y[queries, None] - self.y[candidates])
+                distance[queries[:, None] == candidates] = np.inf
+                next_ring = ring_for(queries, cell, (ring, candidates, distance))
+                if next_ring == ring:
+                    break
+                ring = next_ring
+            yield queries, candidates, distance
+
+    # =============== QUERIES ================
+    # mask of the neighbours within `radius` km
+    def radius_neighbors(self, radius):
+        rings = int(np.ceil(radius / self.cell_size))
+        for queries, candidates, distance in self.blocks(lambda queries, cell, found: rings):
+            yield queries, candidates, distance <= radius
+
+    # mask of the `k` nearest neighbours; rings grow until the k-th distance is inside the
+    # covered square, since anything outside it is farther than ring * cell_size
+    def k_neighbors(self, k):
+        def ring_for(queries, cell, found):
+            if found is None:
+                return 1
+            ring, candidates, distance = found
+            if len(candidates) - 1 >= k:
+                kth = np.partition(distance, k - 1, axis=1)[:, k - 1]
+                if np.all(kth <= ring * self.cell_size):
+                    return ring
+            if len(candidates) >= len(self.order):
+                return ring
+            return ring + 1
+
+        for queries, candidates, distance in self.blocks(ring_for):
+            count = min(k, len(candidates) - 1)
+            if count <= 0:
+                yield queries, candidates, np.zeros_like(distance, dtype=bool)
+                continue
+            kth = np.partition(distance, count - 1, axis=1)[:, count - 1:count]
+            yield queries, candidates, distance <= kth
+
+# =============== NEIGHBOUR STATISTICS ================
+# per house: median and mean price per sqft, mean and median condition and the count of
+# its neighbours, either the k nearest (ties at the k-th distance included) or those within radius km
+def neighbor_stats(data, k=None, radius=None):
+    if (k is None) == (radius is None):
+        raise ValueError('neighbor_stats needs exactly one of k or radius')
+    if k is not None:
+        index = GridIndex.for_neighbors(data['lat'], data['long'], k)
+        neighbors = index.k_neighbors(k)
+    else:
+        index = GridIndex(data['lat'], data['long'], radius)
+        neighbors = index.radius_neighbors(radius)
+
+    price_sqft = data['price_sqft'].to_numpy(dtype=np.float64)
+    condition = data['condition'].to_numpy(dtype=np.float64)
+    stats = np.full((len(data), 5), np.nan)
+    with np.errstate(invalid='ignore'):
+        for queries, candidates, mask in neighbors:
+            prices = np.where(mask, price_sqft[candidates], np.nan)
+            conditions = np.where(mask, condition[candidates], np.nan)
+            count = mask.sum(axis=1)
+            filled = count > 0
+            stats[queries[filled], 0] = np.nanmedian(prices[filled], axis=1)
+            stats[queries[filled], 1] = np.nanmean(prices[filled], axis=1)
+            stats[queries[filled], 2] = np.nanmean(conditions[filled], axis=1)
+            stats[queries[filled], 3] = np.nanmedian(conditions[filled], axis=1)
+            stats[queries, 4] = count
+    return pd.DataFrame(stats, index=data.index,
+                        columns=['neighbor_median_price_sqft', 'neighbor_price_sqft', 'neighbor_condition',
+                                 'neighbor_median_condition', 'neighbor_count'])
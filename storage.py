@@ -0,0 +1,128 @@
+import os
+import hashlib
+import tempfile
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+# =============== SETTINGS ================
+CACHE_DIR = 'cache'
+DATE_FORMAT = '%Y%m%dT%H%M%S'
+
+# explicit dtypes for the King County schema, so nothing is parsed as generic text;
+# zipcodes are a categorical of their text, see conform
+DTYPES = {'id': 'int64', 'price': 'float64', 'bedrooms': 'int64', 'bathrooms': 'float64',
+          'sqft_living': 'int64', 'sqft_lot': 'int64', 'floors': 'float64', 'waterfront': 'int64',
+          'view': 'int64', 'condition': 'int64', 'grade': 'int64', 'sqft_above': 'int64',
+          'sqft_basement': 'int64', 'yr_built': 'int64', 'yr_renovated': 'int64', 'zipcode': 'category',
+          'lat': 'float64', 'long': 'float64', 'sqft_living15': 'int64', 'sqft_lot15': 'int64'}
+
+# =============== HELPERS ================
+def file_hash(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+def cache_path(path):
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(os.path.dirname(path), CACHE_DIR, name + '.feather')
+
+def cache_metadata(path):
+    target = cache_path(path)
+    if not os.path.exists(target):
+        return {}
+    return feather.read_table(target, memory_map=True).schema.metadata or {}
+
+# content hash of the csv, read from the cache metadata while the csv mtime still matches it
+def source_hash(path):
+    metadata = cache_metadata(path)
+    if b'source_hash' in metadata and metadata.get(b'source_mtime') == str(os.stat(path).st_mtime_ns).encode():
+        return metadata[b'source_hash'].decode()
+    return file_hash(path)
+
+def parse_dates(data):
+    data['date'] = pd.to_datetime(data['date'], format=DATE_FORMAT)
+    return data
+
+# the storage schema for source rows however they were read (read_csv with DTYPES, a plain
+# pd.read_csv or a synthetic frame), so frames from every entry point concatenate and match
+def conform(data):
+    data = data.astype({column: dtype for column, dtype in DTYPES.items() if column in data and column != 'zipcode'},
+                       copy=False)
+    if 'zipcode' in data:
+        zipcode = data['zipcode']
+        if pd.api.types.is_categorical_dtype(zipcode):
+            zipcode = zipcode.astype(zipcode.cat.categories.dtype)
+        if pd.api.types.is_numeric_dtype(zipcode):
+            zipcode = zipcode.astype(np.int64)
+        data['zipcode'] = zipcode.astype(str).astype('category')
+    if 'date' in data and not pd.api.types.is_datetime64_any_dtype(data['date']):
+        data = parse_dates(data)
+    return data
+
+# =============== INGEST ================
+# parses the csv once with the explicit schema
+def read_csv(path):
+    data = pd.read_csv(path, dtype=DTYPES)
+    data = conform(data)
+    return data
+
+# writes an uncompressed feather file, so later starts can memory-map it,
+# tagged with the mtime and hash of the csv it was built from
+def ingest(path):
+    data = read_csv(path)
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[b'source_mtime'] = str(os.stat(path).st_mtime_ns).encode()
+    metadata[b'source_hash'] = file_hash(path).encode()
+    table = table.replace_schema_metadata(metadata)
+    write_cache(table, cache_path(path))
+    return data
+
+# yields a temp file of its own next to the target and moves it over the target once written,
+# so concurrent writers of the same file never write into each other's
+@contextmanager
+def replacing(target):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), prefix=os.path.basename(target) + '.', suffix='.tmp')
+    os.close(fd)
+    try:
+        yield tmp
+    except BaseException:
+        os.remove(tmp)
+        raise
+    os.replace(tmp, target)
+
+def write_cache(table, target):
+    with replacing(target) as tmp:
+        feather.write_feather(table, tmp, compression='uncompressed')
+
+# records the new mtime of a csv that was touched but not changed, so later starts skip the hash
+def retag(path):
+    table = feather.read_table(cache_path(path), memory_map=True)
+    metadata = dict(table.schema.metadata or {})
+    metadata[b'source_mtime'] = str(os.stat(path).st_mtime_ns).encode()
+    write_cache(table.replace_schema_metadata(metadata), cache_path(path))
+
+# the cache is fresh when the csv mtime is unchanged, or when it was touched
+# but its content hash still matches
+def is_fresh(path):
+    if not os.path.exists(cache_path(path)):
+        return False
+    metadata = cache_metadata(path)
+    if metadata.get(b'source_mtime') == str(os.stat(path).st_mtime_ns).encode():
+        return True
+    if metadata.get(b'source_hash') != file_hash(path).encode():
+        return False
+    retag(path)
+    return True
+
+def read_dataset(path):
+    if not is_fresh(path):
+        return ingest(path)
+    table = feather.read_table(cache_path(path), memory_map=True)
+    return table.to_pandas(split_blocks=True)
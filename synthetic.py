@@ -0,0 +1,106 @@
+import csv
+import argparse
+import numpy as np
+import pandas as pd
+import storage
+
+# =============== SETTINGS ================
+CHUNK_SIZE = 100000
+# spread around the template house, relative for sizes and prices, in degrees for coordinates
+SIZE_NOISE = 0.1
+PRICE_NOISE = 0.05
+COORDINATE_NOISE = 0.002
+# days between two sales of the same house, and the price change between them
+RESALE_DAYS = (30, 300)
+RESALE_GROWTH = (0.1, 0.05)
+TYPO_BEDROOMS = 33
+# the ids are a bijection of the row number, so they never repeat by accident
+ID_START = 1000000000
+ID_MODULUS = 9000000000
+ID_MULTIPLIER = 7919
+COLUMNS = ['id', 'date', 'price', 'bedrooms', 'bathrooms', 'sqft_living', 'sqft_lot', 'floors', 'waterfront',
+           'view', 'condition', 'grade', 'sqft_above', 'sqft_basement', 'yr_built', 'yr_renovated', 'zipcode',
+           'lat', 'long', 'sqft_living15', 'sqft_lot15']
+
+# =============== MODEL ================
+# template houses and the rates the generator reproduces
+def fit(path):
+    data = storage.read_csv(path)
+    typos = data['bedrooms'] == TYPO_BEDROOMS
+    return {'templates': data.loc[~typos].reset_index(drop=True),
+            'resale_rate': 1 - data['id'].nunique() / len(data),
+            'typo_rate': typos.mean(),
+            'first_date': data['date'].min(),
+            'last_date': data['date'].max()}
+
+# =============== GENERATOR ================
+# new houses drawn from the templates (so zipcode shares, the sale date distribution and
+# the joint attributes follow the source), with sizes, price per sqft and coordinates jittered
+def new_houses(model, rows, start, rng):
+    templates = model['templates']
+    data = templates.iloc[rng.integers(0, len(templates), rows)].reset_index(drop=True)
+    data['id'] = ID_START + (np.arange(start, start + rows, dtype=np.int64) * ID_MULTIPLIER) % ID_MODULUS
+
+    size = rng.lognormal(0, SIZE_NOISE, rows)
+    price_sqft = data['price'] / data['sqft_living'] * rng.lognormal(0, PRICE_NOISE, rows)
+    for column in ['sqft_living', 'sqft_above', 'sqft_basement']:
+        data[column] = np.round(data[column] * size).astype(np.int64)
+    data['sqft_lot'] = np.maximum(np.round(data['sqft_lot'] * rng.lognormal(0, SIZE_NOISE, rows)), 1).astype(np.int64)
+    data['sqft_living'] = np.maximum(data['sqft_living'], 1)
+    data['price'] = np.round(price_sqft * data['sqft_living']).astype(np.int64)
+    data['lat'] = np.round(data['lat'] + rng.normal(0, COORDINATE_NOISE, rows), 4)
+    data['long'] = np.round(data['long'] + rng.normal(0, COORDINATE_NOISE, rows), 3)
+
+    data.loc[rng.random(rows) < model['typo_rate'], 'bedrooms'] = TYPO_BEDROOMS
+    return data
+
+# later sales of already generated houses, keeping their id and attributes
+def resales(model, houses, rows, rng):
+    data = houses.iloc[rng.integers(0, len(houses), rows)].reset_index(drop=True)
+    days = pd.to_timedelta(rng.integers(*RESALE_DAYS, rows), unit='D')
+    data['date'] = (data['date'] + days).clip(upper=model['last_date'])
+    data['price'] = np.round(data['price'] * (1 + rng.normal(*RESALE_GROWTH, rows))).astype(np.int64)
+    return data
+
+def generate_chunk(model, rows, start, rng):
+    resold = min(rng.binomial(rows, model['resale_rate']), rows // 2)
+    houses = new_houses(model, rows - resold, start, rng)
+    data = pd.concat([houses, resales(model, houses, resold, rng)], ignore_index=True)
+    return data.iloc[rng.permutation(len(data))][COLUMNS].reset_index(drop=True)
+
+# yields chunks totalling `rows` rows; each chunk only references itself, so memory stays at one chunk
+def generate(model, rows, chunk_size=CHUNK_SIZE, seed=0):
+    rng = np.random.default_rng(seed)
+    for start in range(0, rows, chunk_size):
+        yield generate_chunk(model, min(chunk_size, rows - start), start, rng)
+
+# =============== OUTPUT ================
+# same text layout as kc_house_data.csv: quoted ids, dates, floors and zipcodes
+def to_source_format(data):
+    data = data.copy()
+    data['id'] = data['id'].astype(str)
+    data['date'] = data['date'].dt.strftime(storage.DATE_FORMAT)
+    data['floors'] = data['floors'].map('{:g}'.format)
+    data['zipcode'] = data['zipcode'].astype(str)
+    return data
+
+def write(path, output, rows, chunk_size=CHUNK_SIZE, seed=0):
+    model = fit(path)
+    with open(output, 'w', newline='') as f:
+        f.write(','.join(COLUMNS) + '\n')
+        for chunk in generate(model, rows, chunk_size, seed):
+            to_source_format(chunk).to_csv(f, header=False, index=False, quoting=csv.QUOTE_NONNUMERIC)
+
+# =============== CLI ================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Writes a synthetic house sales csv statistically similar to the source.')
+    parser.add_argument('rows', type=int, help='rows to generate')
+    parser.add_argument('-o', '--output', default='synthetic_house_data.csv')
+    parser.add_argument('--source', default='kc_house_data.csv', help='csv the generator is fitted on')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    write(args.source, args.output, args.rows, chunk_size=args.chunk_size, seed=args.seed)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+import os
+import json
+import pytest
+import benchmark
+import profiling
+
+PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kc_house_data.csv')
+# json written by `python benchmark.py --output` on this machine, compared against when set
+BASELINE = os.environ.get('BENCHMARK_BASELINE')
+STAGES = ['cleaning_data', 'regional_stats', 'ft_buy', 'ft_df_buy', 'run_pipeline']
+
+@pytest.fixture(scope='module')
+def results():
+    return benchmark.run(PATH, scales=[1, 10])
+
+# =============== RUN ================
+def test_every_stage_is_timed(results):
+    for factor in ['1', '10']:
+        stages = results[factor]['stages']
+        assert all(name in stages for name in STAGES)
+        assert stages['run_pipeline']['rows'] > 0
+    assert results['10']['rows'] == 10 * results['1']['rows']
+    assert list(benchmark.summary(results).columns) == ['1x wall (s)', '10x wall (s)']
+
+# the pipeline stays linear in the rows: a row-wise apply or a quadratic join would not
+def test_pipeline_scales_linearly(results):
+    wall = {factor: result['stages']['run_pipeline']['wall'] for factor, result in results.items()}
+    assert wall['10'] < wall['1'] * 30
+
+def test_trace_memory_records_peaks():
+    with profiling.traced_memory():
+        results = benchmark.run(PATH, scales=[1])
+    assert results['1']['stages']['run_pipeline']['peak_memory'] > 0
+    assert not profiling.tracemalloc.is_tracing()
+
+# =============== REGRESSIONS ================
+def test_regressions_flag_slower_stages():
+    baseline = {'1': {'stages': {'ft_buy': {'wall': 1.0}, 'ft_season': {'wall': 1.0}}}}
+    results = {'1': {'stages': {'ft_buy': {'wall': 1.5}, 'ft_season': {'wall': 1.1}, 'ft_grade': {'wall': 9.0}}}}
+    assert benchmark.regressions(results, baseline) == ['1x ft_buy: 1.0000s -> 1.5000s']
+
+@pytest.mark.skipif(not BASELINE, reason='BENCHMARK_BASELINE is not set')
+def test_no_regression_over_baseline():
+    with open(BASELINE) as f:
+        baseline = json.load(f)
+    results = benchmark.run(PATH, scales=[int(factor) for factor in baseline])
+    assert benchmark.regressions(results, baseline) == []
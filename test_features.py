@@ -0,0 +1,102 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import storage
+import pipeline
+import regional
+
+PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kc_house_data.csv')
+
+# =============== ORACLES ================
+# the row-wise implementations the vectorized features replaced
+def season_oracle(month, day):
+    if (month == 12 and day >= 21) or month in (1, 2) or (month == 3 and day < 21):
+        return 'winter'
+    if (month == 3 and day >= 21) or month in (4, 5) or (month == 6 and day < 21):
+        return 'spring'
+    if (month == 6 and day >= 21) or month in (7, 8) or (month == 9 and day < 23):
+        return 'summer'
+    return 'fall'
+
+def last_maintenance_oracle(built, renovated):
+    return built if renovated == 0 else renovated
+
+def grade_oracle(grade):
+    return ('very poor' if grade <= 3 else 'poor' if grade <= 5 else 'average' if grade <= 8 else
+            'good' if grade <= 10 else 'excelent' if grade <= 13 else 'na')
+
+def bathrooms_oracle(data):
+    parts = pd.DataFrame(data['bathrooms'].astype(str).str.split('.', expand=True))
+    data = data.assign(complete_bathrooms=np.int64(parts[0]),
+                       half_bathroom=parts[1].apply(lambda x: 'no' if x == '0' else 'yes'))
+    return data.loc[data['complete_bathrooms'] != 0].drop(columns=['bathrooms']).reset_index(drop=True)
+
+def buy_oracle(data):
+    return data.apply(lambda x: 'yes' if ((x['price_sqft'] < x['regional_price_sqft']) &
+                                          (x['regional_condition'] < x['condition']) &
+                                          ((x['expected_price'] / x['price']) > 1.6)) else 'no', axis=1)
+
+@pytest.fixture(scope='module')
+def data():
+    return pipeline.cleaning_data(storage.read_csv(PATH))
+
+# =============== SEASON ================
+@pytest.mark.parametrize('month, day, expected', [(3, 20, 'winter'), (3, 21, 'spring'), (6, 20, 'spring'),
+                                                  (6, 21, 'summer'), (9, 22, 'summer'), (9, 23, 'fall'),
+                                                  (12, 20, 'fall'), (12, 21, 'winter')])
+def test_season_edges(month, day, expected):
+    assert pipeline.season(month=[month], day=[day])[0] == expected
+    assert season_oracle(month, day) == expected
+
+def test_season_every_day_of_the_year():
+    days = pd.date_range('2016-01-01', '2016-12-31')
+    expected = [season_oracle(day.month, day.day) for day in days]
+    assert list(pipeline.season(month=days.month, day=days.day)) == expected
+
+def test_ft_season(data):
+    result = pipeline.ft_season(data.copy())
+    expected = [season_oracle(date.month, date.day) for date in data['date']]
+    assert list(result['season']) == expected
+
+# =============== ROW FEATURES ================
+def test_ft_last_maintenance(data):
+    result = pipeline.ft_last_maintenance(data.copy())
+    expected = [last_maintenance_oracle(built, renovated) for built, renovated in zip(data['yr_built'], data['yr_renovated'])]
+    assert list(result['last_maintenance']) == expected
+
+def test_ft_grade(data):
+    result = pipeline.ft_grade(data.copy())
+    expected = pd.Categorical([grade_oracle(grade) for grade in data['grade']])
+    assert list(result['grade'].astype(str)) == list(expected)
+    assert list(result['grade'].cat.categories) == list(expected.categories)
+    assert list(result['grade'].cat.categories) == ['average', 'excelent', 'good', 'poor', 'very poor']
+
+def test_ft_grade_bounds():
+    grades = pd.DataFrame({'grade': [1, 3, 4, 5, 6, 8, 9, 10, 11, 13, 14]})
+    result = pipeline.ft_grade(grades.copy())
+    assert list(result['grade'].astype(str)) == [grade_oracle(grade) for grade in grades['grade']]
+
+def test_ft_bathrooms(data):
+    result = pipeline.ft_bathrooms(data.copy())
+    expected = bathrooms_oracle(data.copy())
+    pd.testing.assert_series_equal(result['complete_bathrooms'], expected['complete_bathrooms'])
+    assert list(result['half_bathroom'].astype(str)) == list(expected['half_bathroom'])
+    assert list(result['id']) == list(expected['id'])
+
+def test_ft_bathrooms_edges():
+    bathrooms = pd.DataFrame({'id': [1, 2, 3], 'bathrooms': [0.5, 1.0, 2.25]})
+    result = pipeline.ft_bathrooms(bathrooms.copy())
+    expected = bathrooms_oracle(bathrooms.copy())
+    assert list(result['id']) == list(expected['id']) == [2, 3]
+    assert list(result['complete_bathrooms']) == list(expected['complete_bathrooms']) == [1, 2]
+    assert list(result['half_bathroom'].astype(str)) == list(expected['half_bathroom']) == ['no', 'yes']
+
+# =============== BUY ================
+def test_ft_buy(data):
+    data = pipeline.row_features(data.copy())
+    stats = regional.regional_stats(data)
+    data = pipeline.ft_regional_condition(pipeline.ft_regional_price(data, stats), stats)
+    result = pipeline.ft_buy(data.copy())
+    assert list(result['buy']) == list(buy_oracle(data))
+    assert (result['buy'] == 'yes').sum() > 0
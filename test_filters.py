@@ -0,0 +1,51 @@
+import os
+import numpy as np
+import pytest
+import storage
+import pipeline
+import filters
+import valuation
+import whatif
+
+PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kc_house_data.csv')
+
+@pytest.fixture(scope='module')
+def data():
+    return pipeline.run_pipeline(storage.read_csv(PATH))[0]
+
+# the buy list of the investment view priced by the ridge model, as the dashboard builds it
+@pytest.fixture(scope='module')
+def ridge(data):
+    model = valuation.ZipcodeRidge().fit(pipeline.condition_score(data))
+    criteria = whatif.criteria(data, model.predict(pipeline.condition_score(data)))
+    return criteria, filters.HouseIndex(data, whatif.priced_columns(criteria))
+
+def buy_rows(criteria, index, query):
+    rows = index.query(query)
+    return rows[whatif.buy_mask(whatif.subset(criteria, rows))]
+
+# =============== PRICING ================
+def test_ridge_sort_follows_the_shown_prices(ridge):
+    criteria, index = ridge
+    rows = buy_rows(criteria, index, {})
+    assert len(rows) > 0
+    for column in ['profit', 'expected_price']:
+        shown = criteria[column][index.sort(rows, column, ascending=False)]
+        assert (np.diff(shown) <= 0).all(), column
+        assert sorted(shown) == sorted(criteria[column][rows])
+
+def test_ridge_margin_filter_follows_the_shown_prices(ridge):
+    criteria, index = ridge
+    every = buy_rows(criteria, index, {})
+    margin = filters.profit_margin(criteria['expected_price'], criteria['price'])
+    for low in [50, 100, 150]:
+        rows = buy_rows(criteria, index, {'profit_margin': (low, np.inf)})
+        assert list(rows) == list(every[margin[every] >= low])
+
+def test_regional_pricing_keeps_the_pipeline_index(data):
+    criteria = whatif.criteria(data)
+    index, priced = filters.HouseIndex(data), filters.HouseIndex(data, whatif.priced_columns(criteria))
+    for column in filters.SORT_COLUMNS:
+        assert (index.orders[column] == priced.orders[column]).all()
+    query = {'profit_margin': (60, np.inf), 'zipcode': ['98103']}
+    assert list(index.query(query)) == list(priced.query(query))
@@ -0,0 +1,52 @@
+import os
+import numpy as np
+import pandas as pd
+import storage
+import pipeline
+
+PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kc_house_data.csv')
+
+# same rows as a full run, in any order
+def assert_same_output(result, expected):
+    data, full = result[0].sort_values('id').reset_index(drop=True), expected[0].sort_values('id').reset_index(drop=True)
+    assert list(data.columns) == list(full.columns)
+    assert list(data['id']) == list(full['id'])
+    for column in data.columns:
+        if column == 'date' or not pd.api.types.is_numeric_dtype(full[column]):
+            assert list(data[column].astype(str)) == list(full[column].astype(str)), column
+        else:
+            # the running means may differ from the grouped ones in the last cent
+            assert np.allclose(data[column].astype(np.float64), full[column].astype(np.float64),
+                               rtol=0, atol=0.0100001, equal_nan=True), column
+    assert sorted(result[1]['id']) == sorted(expected[1]['id'])
+
+# =============== APPEND ================
+# a daily batch read with a plain pd.read_csv has integer zipcodes and text dates
+def test_append_plain_csv_batch(tmp_path):
+    source = pd.read_csv(PATH, dtype=str).sort_values('date', kind='mergesort')
+    history, batch = source.iloc[:-500], source.iloc[-500:]
+    batch.to_csv(tmp_path / 'daily.csv', index=False)
+
+    dropped = {}
+    data, df_buy, stats = pipeline.run_pipeline(storage.conform(history.astype(storage.DTYPES)), dropped=dropped)
+    result = pipeline.append_data(data, df_buy, stats, pd.read_csv(tmp_path / 'daily.csv'), dropped=dropped)
+
+    assert len(result[0]) > len(data)
+    assert_same_output(result, pipeline.run_pipeline(storage.read_csv(PATH)))
+
+# a later sale of an id whose first sale was dropped for having no complete bathroom is not bought
+def test_append_keeps_dedup_of_dropped_sales():
+    raw = storage.read_csv(PATH).sort_values('date', kind='mergesort').reset_index(drop=True)
+    first = raw.iloc[:1000].copy()
+    first.loc[first.index[0], 'bathrooms'] = 0.5
+    later = first.iloc[[0]].copy()
+    later['date'] = raw['date'].max()
+    later['bathrooms'] = 2.0
+
+    dropped = {}
+    data, df_buy, stats = pipeline.run_pipeline(first.copy(), dropped=dropped)
+    result = pipeline.append_data(data, df_buy, stats, later.copy(), dropped=dropped)
+
+    assert first['id'].iloc[0] in dropped
+    assert first['id'].iloc[0] not in set(result[0]['id'])
+    assert_same_output(result, pipeline.run_pipeline(pd.concat([first, later], ignore_index=True)))
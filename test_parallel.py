@@ -0,0 +1,33 @@
+import os
+import pandas as pd
+import storage
+import regional
+import pipeline
+import parallel
+
+PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kc_house_data.csv')
+
+def test_regional_stats_of_no_rows():
+    data = pipeline.row_features(pipeline.cleaning_data(storage.read_csv(PATH).iloc[:0].copy()))
+    stats = regional.regional_stats(data)
+    assert len(stats) == 0
+    assert 'regional_profit_q50' in stats
+
+# two zipcodes on four workers leaves at least two hash shards empty
+def test_more_workers_than_zipcodes():
+    raw = storage.read_csv(PATH)
+    raw = raw.loc[raw['zipcode'].isin(['98001', '98103'])].reset_index(drop=True)
+    data, df_buy, stats = parallel.run_pipeline(raw.copy(), workers=4)
+    expected = pipeline.run_pipeline(raw.copy())
+    pd.testing.assert_frame_equal(data, expected[0])
+    pd.testing.assert_frame_equal(df_buy, expected[1])
+    pd.testing.assert_frame_equal(stats, expected[2])
+
+def test_no_rows():
+    raw = storage.read_csv(PATH).iloc[:0]
+    data, df_buy, stats = parallel.run_pipeline(raw.copy(), workers=4)
+    expected = pipeline.run_pipeline(raw.copy())
+    assert len(data) == len(df_buy) == len(stats) == 0
+    pd.testing.assert_frame_equal(data, expected[0])
+    pd.testing.assert_frame_equal(df_buy, expected[1])
+    pd.testing.assert_frame_equal(stats, expected[2])
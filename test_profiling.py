@@ -0,0 +1,72 @@
+import threading
+import tracemalloc
+import profiling
+
+def allocate():
+    return [bytearray(1024) for _ in range(1000)]
+
+def run(target):
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread
+
+# =============== MEMORY ================
+def test_traced_stages_record_their_peak():
+    profiler = profiling.Profiler()
+    with profiler.traced_memory():
+        with profiler.stage('outer'):
+            with profiler.stage('inner'):
+                allocate()
+    assert profiler.records['inner']['peak_memory'] >= 1024 * 1000
+    assert profiler.records['outer']['peak_memory'] >= profiler.records['inner']['peak_memory']
+    assert not tracemalloc.is_tracing()
+
+# a session whose stage is open while a diagnostics rerun starts and stops the trace
+def test_stage_of_another_thread_while_tracing_stops():
+    profiler = profiling.Profiler()
+    opened, traced = threading.Event(), threading.Event()
+    def session():
+        with profiler.stage('session'):
+            opened.set()
+            traced.wait(5)
+            allocate()
+    def diagnostics():
+        opened.wait(5)
+        with profiler.traced_memory():
+            with profiler.stage('diagnostics'):
+                allocate()
+        traced.set()
+    threads = [run(session), run(diagnostics)]
+    for thread in threads:
+        thread.join()
+    assert profiler.records['session']['peak_memory'] is None
+    assert profiler.records['diagnostics']['peak_memory'] >= 0
+
+# other threads do not reset the peak of the traced one, and traced runs take turns
+def test_one_traced_thread_at_a_time():
+    profiler = profiling.Profiler()
+    inside, release = threading.Event(), threading.Event()
+    order = []
+    def first():
+        with profiler.traced_memory():
+            inside.set()
+            with profiler.stage('first'):
+                allocate()
+                release.wait(5)
+            order.append('first')
+    def second():
+        inside.wait(5)
+        with profiler.stage('untraced'):
+            allocate()
+        with profiler.traced_memory():
+            order.append('second')
+    threads = [run(first), run(second)]
+    inside.wait(5)
+    threads[1].join(0.2)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert order == ['first', 'second']
+    assert profiler.records['untraced']['peak_memory'] is None
+    assert profiler.records['first']['peak_memory'] >= 1024 * 1000
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,76 @@
+import os
+import glob
+import shutil
+import threading
+import pandas as pd
+import pytest
+import storage
+import registry
+
+PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kc_house_data.csv')
+
+@pytest.fixture
+def market(tmp_path):
+    path = str(tmp_path / 'houses.csv')
+    shutil.copy(PATH, path)
+    return path, storage.file_hash(path)
+
+# =============== STORE ================
+def test_build_records_stages_for_warm_starts(market):
+    path, version = market
+    data, df_buy, stats = registry.build(path, version)
+    stages = registry.read_stages(path, version)
+    assert stages['run_pipeline']['rows'] == len(data)
+    assert 'ft_df_buy' in stages
+
+    # a warm start reads the store back and keeps the timings of the build
+    registry.build(path, version)
+    assert registry.read_stages(path, version) == stages
+    assert registry.read_stages(path, 'other') == {}
+
+def test_concurrent_builds_share_the_store(market):
+    path, version = market
+    threads = [threading.Thread(target=registry.build, args=(path, version)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert glob.glob(os.path.join(os.path.dirname(path), storage.CACHE_DIR, '*.tmp')) == []
+    assert len(registry.build(path, version)[0]) == 21351
+
+# =============== REGISTRY ================
+def test_markets_build_concurrently(monkeypatch):
+    started = {'a': threading.Event(), 'b': threading.Event()}
+    def build(path, version, region, workers):
+        started[path].set()
+        # each build waits for the other market's, which a registry-wide lock would never start
+        assert started['b' if path == 'a' else 'a'].wait(5)
+        return (pd.DataFrame({'x': [1]}),)
+    monkeypatch.setattr(registry, 'build', build)
+
+    markets = registry.Registry({'A': 'a', 'B': 'b'})
+    threads = [threading.Thread(target=markets.load, args=(name, 'v')) for name in 'AB']
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(markets.loaded) == 2
+
+def test_sessions_wait_for_one_build(monkeypatch):
+    builds = []
+    def build(path, version, region, workers):
+        builds.append(path)
+        threading.Event().wait(0.1)
+        return (pd.DataFrame({'x': [1]}),)
+    monkeypatch.setattr(registry, 'build', build)
+
+    markets = registry.Registry({'A': 'a'})
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(markets.load('A', 'v'))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert builds == ['a']
+    assert all(frames is results[0] for frames in results)
+    assert markets.building == {}
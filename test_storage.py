@@ -0,0 +1,33 @@
+import os
+import shutil
+import pandas as pd
+import storage
+
+PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kc_house_data.csv')
+
+# =============== SCHEMA ================
+def test_conform_matches_read_csv():
+    expected = storage.read_csv(PATH)
+    plain = storage.conform(pd.read_csv(PATH))
+    pd.testing.assert_series_equal(plain.dtypes, expected.dtypes)
+    assert plain['zipcode'].cat.categories.equals(expected['zipcode'].cat.categories)
+    assert isinstance(plain['zipcode'].iloc[0], str)
+
+def test_conform_integer_and_categorical_zipcodes():
+    numbers = pd.DataFrame({'zipcode': [98001, 98002]})
+    categories = pd.DataFrame({'zipcode': pd.Categorical([98001, 98002])})
+    for data in [numbers, categories]:
+        assert list(storage.conform(data)['zipcode'].astype(str)) == ['98001', '98002']
+        assert storage.conform(data)['zipcode'].cat.categories.dtype == object
+
+# =============== CACHE ================
+def test_touched_csv_is_retagged(tmp_path):
+    path = str(tmp_path / 'houses.csv')
+    shutil.copy(PATH, path)
+    storage.read_dataset(path)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    assert storage.is_fresh(path)
+    assert storage.cache_metadata(path)[b'source_mtime'] == str(os.stat(path).st_mtime_ns).encode()
+    assert storage.source_hash(path) == storage.file_hash(path)
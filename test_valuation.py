@@ -0,0 +1,67 @@
+import os
+import copy
+import numpy as np
+import pytest
+import storage
+import pipeline
+import valuation
+
+PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kc_house_data.csv')
+
+@pytest.fixture(scope='module')
+def data():
+    data = pipeline.run_pipeline(storage.read_csv(PATH))[0].sort_values('date', kind='mergesort')
+    return pipeline.condition_score(data.reset_index(drop=True))
+
+# the statistics of the rows from scratch, with the standardization and prior of the model
+def accumulate(model, data):
+    fresh = copy.deepcopy(model)
+    fresh.groups = {}
+    fresh.xtx, fresh.xty = np.zeros((0,) + model.xtx.shape[1:]), np.zeros((0, model.xty.shape[1]))
+    return fresh.update(data)
+
+def by_group(model, values):
+    return {key: values[code] for key, code in model.groups.items()}
+
+def assert_same_model(model, expected):
+    assert set(model.groups) == set(expected.groups)
+    for name in ['xtx', 'xty', 'coef']:
+        values, other = by_group(model, getattr(model, name)), by_group(expected, getattr(expected, name))
+        for key in values:
+            assert np.allclose(values[key], other[key], rtol=1e-9, atol=1e-6), (name, key)
+
+# =============== SUFFICIENT STATISTICS ================
+def test_fit_sums_every_zipcode(data, monkeypatch):
+    monkeypatch.setattr(valuation, 'CHUNK_SIZE', 997)
+    model = valuation.ZipcodeRidge().fit(data)
+    x, price = model.features(data), data['price'].to_numpy(dtype=np.float64)
+    codes = model.group_codes(data)
+    for key, code in model.groups.items():
+        rows = codes == code
+        assert np.allclose(model.xtx[code], x[rows].T @ x[rows])
+        assert np.allclose(model.xty[code], x[rows].T @ price[rows])
+
+def test_chunks_do_not_change_the_fit(data, monkeypatch):
+    expected = valuation.ZipcodeRidge().fit(data)
+    monkeypatch.setattr(valuation, 'CHUNK_SIZE', 333)
+    assert_same_model(valuation.ZipcodeRidge().fit(data), expected)
+
+# =============== UPDATE ================
+# fit sets the standardization and the prior, which an update keeps: the updated model
+# equals the one whose statistics were summed over all the rows with that same scaling
+def test_fit_then_update_equals_fit_on_all(data):
+    split = int(len(data) * 0.8)
+    model = valuation.ZipcodeRidge().fit(data.iloc[:split])
+    expected = accumulate(model, data)
+    assert_same_model(model.update(data.iloc[split:]), expected)
+
+    full = valuation.ZipcodeRidge().fit(data)
+    assert_same_model(accumulate(full, data), full)
+
+def test_update_is_undone_by_negative_sign(data):
+    split = int(len(data) * 0.8)
+    model = valuation.ZipcodeRidge().fit(data.iloc[:split])
+    expected = copy.deepcopy(model)
+    model.update(data.iloc[split:]).update(data.iloc[split:], sign=-1)
+    assert_same_model(model, expected)
+    assert np.allclose(model.predict(data), expected.predict(data))
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import profiling
+
+# =============== SETTINGS ================
+# features of the row-local pipeline output; condition must still be the numeric score
+NUMERIC_COLUMNS = ['sqft_living', 'sqft_lot', 'bedrooms', 'complete_bathrooms', 'floors', 'condition', 'age']
+CATEGORY_COLUMNS = ['grade', 'view', 'waterfront', 'half_bathroom']
+# ridge penalty on the standardized features, pulling every zipcode towards the county-wide fit
+ALPHA = 10.0
+# rows per chunk of the X'X sums, each holds a (rows, features, features) array
+CHUNK_SIZE = 10000
+
+# =============== GROUP SUMS ================
+# rows of every array summed per code: the rows are sorted by code and every run of equal
+# codes is reduced in one call, so the memory stays that of the chunk whatever the number of zipcodes
+def group_sums(codes, *arrays):
+    order = np.argsort(codes, kind='stable')
+    codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    return (codes[starts],) + tuple(np.add.reduceat(values[order], starts) for values in arrays)
+
+# =============== PER-ZIPCODE RIDGE ================
+# closed-form ridge regression of the price, one coefficient vector per zipcode. Only the
+# sufficient statistics X'X and X'y of every zipcode are kept: fit and update sum them per
+# zipcode one chunk at a time and all the zipcodes are solved in a single batched call.
+# The county-wide prior is set by fit and kept by update, so an update only changes the
+# coefficients of the zipcodes it touches
+class ZipcodeRidge:
+    def __init__(self, alpha=ALPHA, key='zipcode'):
+        self.alpha = alpha
+        self.key = key
+        self.fitted = False
+
+    @staticmethod
+    def numeric(data):
+        age = data['date'].dt.year.to_numpy() - data['last_maintenance'].to_numpy()
+        return np.column_stack([age if column == 'age' else data[column].to_numpy(dtype=np.float64)
+                                for column in NUMERIC_COLUMNS]).astype(np.float64)
+
+    # intercept, standardized numeric columns and category dummies
+    def features(self, data):
+        numeric = self.numeric(data)
+        dummies = [np.asarray(data[column].astype(object).to_numpy()[:, None] == np.array(levels, dtype=object)[None, :],
+                              dtype=np.float64)
+                   for column, levels in self.levels.items()]
+        return np.column_stack([np.ones(len(data)), (numeric - self.mean) / self.scale] + dummies)
+
+    # positions of the rows' zipcodes in the coefficient table, -1 for unseen ones
+    def group_codes(self, data, add=False):
+        keys = data[self.key].astype(object).to_numpy()
+        if add:
+            for key in pd.unique(keys):
+                if key not in self.groups:
+                    self.groups[key] = len(self.groups)
+            grown = len(self.groups) - len(self.xtx)
+            if grown > 0:
+                self.xtx = np.concatenate([self.xtx, np.zeros((grown,) + self.xtx.shape[1:])])
+                self.xty = np.concatenate([self.xty, np.zeros((grown, self.xty.shape[1]))])
+        return pd.Index(list(self.groups)).get_indexer(keys) if self.groups else np.full(len(keys), -1)
+
+    # the first category of each column is the baseline and gets no dummy
+    @profiling.profiled
+    def fit(self, data):
+        numeric = self.numeric(data)
+        self.mean = numeric.mean(axis=0)
+        self.scale = numeric.std(axis=0)
+        self.scale[self.scale == 0] = 1.0
+        self.levels = {column: sorted(data[column].astype(object).unique().tolist(), key=str)[1:] for column in CATEGORY_COLUMNS}
+        size = 1 + len(NUMERIC_COLUMNS) + sum(len(levels) for levels in self.levels.values())
+        self.penalty = np.eye(size) * self.alpha
+        self.penalty[0, 0] = 0
+
+        self.groups = {}
+        self.xtx, self.xty = np.zeros((0, size, size)), np.zeros((0, size))
+        self.update(data, solve=False)
+        self.prior = np.linalg.solve(self.xtx.sum(axis=0) + self.penalty, self.xty.sum(axis=0))
+        self.fitted = True
+        return self.solve()
+
+    # adds (sign=1) or removes (sign=-1) rows from the sufficient statistics and refits
+    def update(self, data, sign=1, solve=True):
+        codes = self.group_codes(data, add=True)
+        price = data['price'].to_numpy(dtype=np.float64)
+        for start in range(0, len(data), CHUNK_SIZE):
+            x = self.features(data.iloc[start:start + CHUNK_SIZE])
+            groups, xtx, xty = group_sums(codes[start:start + CHUNK_SIZE], x[:, :, None] * x[:, None, :],
+                                          x * price[start:start + CHUNK_SIZE, None])
+            self.xtx[groups] += sign * xtx
+            self.xty[groups] += sign * xty
+        return self.solve() if solve else self
+
+    # (X'X + alpha I) b = X'y + alpha I prior for every zipcode at once
+    def solve(self):
+        self.coef = np.linalg.solve(self.xtx + self.penalty, (self.xty + self.penalty @ self.prior)[:, :, None])[:, :, 0]
+        return self
+
+    @profiling.profiled
+    def predict(self, data):
+        codes = self.group_codes(data)
+        predicted = np.empty(len(data))
+        for start in range(0, len(data), CHUNK_SIZE):
+            x = self.features(data.iloc[start:start + CHUNK_SIZE])
+            chunk = codes[start:start + CHUNK_SIZE]
+            coef = np.where((chunk >= 0)[:, None], self.coef[chunk], self.prior)
+            predicted[start:start + len(x)] = (x * coef).sum(axis=1)
+        return pd.Series(predicted, index=data.index, name='expected_price')
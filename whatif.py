@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pipeline
+
+# =============== SETTINGS ================
+# how each precomputed column is compared with its threshold, as in pipeline.ft_buy
+COMPARISONS = {'margin': np.greater, 'price_sqft_ratio': np.less, 'condition_delta': np.greater}
+DEFAULTS = {'margin': pipeline.MARGIN, 'price_sqft_ratio': pipeline.PRICE_SQFT_RATIO,
+            'condition_delta': pipeline.CONDITION_DELTA}
+# threshold grids of the sensitivity sweep, also the range of the sidebar sliders
+SWEEP = {'margin': np.round(np.arange(1.0, 3.0001, 0.05), 2),
+         'price_sqft_ratio': np.round(np.arange(0.5, 1.5001, 0.05), 2),
+         'condition_delta': np.round(np.arange(-2.0, 2.0001, 0.1), 1)}
+
+# =============== CRITERIA ================
+# the sides of every ft_buy comparison reduced to one column per threshold, computed once
+# per pipeline output; houses in bad condition are never bought. expected_price replaces
+# the one of the pipeline, as a valuation model predicts it
+def criteria(data, expected_price=None):
+    condition = pipeline.condition_score(data[['condition']])['condition'].to_numpy(dtype=np.float64)
+    if expected_price is not None:
+        data = data[['price', 'price_sqft', 'regional_price_sqft', 'regional_condition', 'condition']].assign(
+            expected_price=np.round(np.asarray(expected_price, dtype=np.float64), 2))
+        data['profit'] = round(data['expected_price'] - data['price'], 2)
+    return {'margin': (data['expected_price'] / data['price']).to_numpy(dtype=np.float64),
+            'price_sqft_ratio': (data['price_sqft'] / data['regional_price_sqft']).to_numpy(dtype=np.float64),
+            'condition_delta': condition - data['regional_condition'].to_numpy(dtype=np.float64),
+            'eligible': (data['condition'] != 'bad').to_numpy(),
+            'price': data['price'].to_numpy(dtype=np.float64),
+            'expected_price': data['expected_price'].to_numpy(dtype=np.float64),
+            'profit': data['profit'].to_numpy(dtype=np.float64)}
+
+# the columns of the pipeline output a pricing replaces, so the filters, the sorting and the
+# map of the investment view follow the prices the buy list shows
+def priced_columns(criteria):
+    return {'expected_price': criteria['expected_price'], 'profit': criteria['profit']}
+
+def subset(criteria, rows):
+    return {name: values[rows] for name, values in criteria.items()}
+
+# =============== SCORING ================
+# buy mask for the thresholds, missing ones keep the pipeline defaults; `free` leaves one criterion out
+def buy_mask(criteria, free=None, **thresholds):
+    thresholds = {**DEFAULTS, **thresholds}
+    mask = criteria['eligible'].copy()
+    for name, compare in COMPARISONS.items():
+        if name != free:
+            mask &= compare(criteria[name], thresholds[name])
+    return mask
+
+# houses, invested value and expected profit for every value of one threshold, the others
+# fixed: the grid is compared with the column in one broadcast and summed with matrix products
+def sweep(criteria, parameter, values=None, **thresholds):
+    values = SWEEP[parameter] if values is None else np.asarray(values)
+    fixed = buy_mask(criteria, free=parameter, **thresholds)
+    grid = COMPARISONS[parameter](criteria[parameter][None, :], values[:, None]) & fixed[None, :]
+    return pd.DataFrame({'houses': grid.sum(axis=1),
+                         'invested': grid @ criteria['price'],
+                         'expected_profit': grid @ criteria['profit']},
+                        index=pd.Index(values, name=parameter))